@@ -4,13 +4,15 @@
 # Used for converting multi and single channel uncompressed
 # audio to a single waveform for analog transcription.
 
-import aifc # https://docs.python.org/3/library/aifc.html#module-aifc
-import wave # https://docs.python.org/3/library/wave.html
-import numpy as np # https://numpy.org/
-import math
+import os
 import sys
 
-# Bit depths of 8, 16, and 32 are supported for conversion
+# Decoding, the readers and the sample file format are shared with src/audio_io.py,
+# which opens aiff files through aifc where Python still has it
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'src'))
+import audio_io  # noqa: E402
+
+# Bit depths of 8, 16, 24 and 32 are supported for conversion
 # However, a bit depth of 12 is the max range of a standard record player
 
 from enum import Enum
@@ -20,65 +22,62 @@ class audio_mode(Enum):
   MONO = 1
   STEREO = 2
 
-# Averages the wave for each channel
-def process_channels(auto_data, numch, numframes):
-  merged = np.zeros((numframes//numch,), dtype=np.byte)
-  for i in range(0, numch):
-    print ("Extracting {} / {} channels".format(i+1, numch))
-    ch_data = auto_data[i:numframes:numch]
-    print(len(ch_data))
-    merged = np.add(merged, ch_data)
-  return np.divide(merged, numch)
-
-def normalize_data(arr, numch, depth):
-  assert depth > 0
-  bit_depth = depth*8
-  for i in range(0, numch):
-    if arr[i] > 2**(bit_depth - 1):
-      arr[i] = (arr[i]-2**bit_depth)
-    elif arr[i] == 2**(bit_depth - 1):
-      arr[i] = 0
-  return arr
-
-def write_channels(merged, filename):
-  csvfile = open(filename.split(".")[0] + '.csv', 'w', newline='')
-  for item in merged.astype(str):
-    csvfile.write(item + ',')
-  # Write a zero at the end of the file to supress the extra ','
-  csvfile.write('0')
-  csvfile.close()
-
-def aifctocsv(filename, mode=audio_mode.MONO):
-  with aifc.open(filename, 'rb') as aif:
-    numframes = aif.getnframes()
-    numframes -= numframes % 2
-
-    # Create buffer for audio channel(s)
-    auto_data = np.frombuffer(aif.readframes(numframes), dtype=np.byte)
-    numch = aif.getnchannels()
-    depth = aif.getsampwidth()
-    merged = process_channels(auto_data, numch, numframes)
-    write_channels(normalize_data(merged, numch, depth), filename)
-
-def wavetocsv(filename, mode=audio_mode.MONO):
-  with wave.open(filename, 'rb') as wav:
-    numframes = wav.getnframes()
-    numframes -= numframes % 2
-    
-    auto_data = np.frombuffer(wav.readframes(numframes), dtype=np.byte)
-
+# Frames read and converted at a time, so long files are never held in memory
+CHUNK_FRAMES = 1 << 18
+
+def write_channels(blocks, filename):
+  with open(filename.split(".")[0] + '.csv', 'w', newline='') as csvfile:
+    for merged in blocks:
+      for item in merged.astype(str):
+        csvfile.write(item + ',')
+    # Write a zero at the end of the file to supress the extra ','
+    csvfile.write('0')
+
+# Binary sample file, read back by src/audio_io.py
+def write_samples(blocks, filename, sample_rate):
+  audio_io.write_sample_blocks(os.path.splitext(filename)[0] + audio_io.SAMPLE_EXTENSION,
+                               blocks, sample_rate)
+
+def write_output(blocks, filename, sample_rate, binary=True):
+  if binary:
+    write_samples(blocks, filename, sample_rate)
+  else:
+    write_channels(blocks, filename)
+
+# Reads, scales and averages the frames of an open wave or aiff file a chunk at a time
+# Wave files are little-endian with unsigned 8 bit samples,
+# aiff files are big-endian and always signed
+def read_blocks(reader, big_endian=False):
+  numch = reader.getnchannels()
+  depth = reader.getsampwidth()
+  print ("Averaging {} channel(s) over {} frames".format(numch, reader.getnframes()))
+  while True:
+    frames = audio_io.decode_pcm(reader.readframes(CHUNK_FRAMES), depth, numch, big_endian)
+    if len(frames) == 0:
+      return
     # Averages the wave for each channel
-    numch = wav.getnchannels()
-    depth = wav.getsampwidth()
-    merged = process_channels(auto_data, numch, numframes)
-    write_channels(normalize_data(merged, numch, depth), filename)
+    yield frames.mean(axis=1)
+
+def aifctocsv(filename, mode=audio_mode.MONO, binary=True):
+  with audio_io.open_lpcm(filename) as aif:
+    write_output(read_blocks(aif, big_endian=True), filename, aif.getframerate(), binary)
+
+def wavetocsv(filename, mode=audio_mode.MONO, binary=True):
+  with audio_io.open_lpcm(filename) as wav:
+    write_output(read_blocks(wav), filename, wav.getframerate(), binary)
 
 def main():
-  if len(sys.argv) != 2 :
+  # Binary sample files are written unless --csv is given
+  args = sys.argv[1:]
+  binary = '--csv' not in args
+  if not binary:
+    args.remove('--csv')
+
+  if len(args) != 1 :
     print('Wrong number of arguements.')
     quit()
 
-  filename = sys.argv[1]
+  filename = args[0]
   if '.' not in filename:
     print('File extension must be provided.')
     quit()
@@ -87,9 +86,13 @@ def main():
 
     
   if extension in ['wav', 'wave']:
-    wavetocsv(filename)
+    wavetocsv(filename, binary=binary)
   elif extension in ['aifc', 'aiff']:
-    aifctocsv(filename)
+    try:
+      aifctocsv(filename, binary=binary)
+    except ValueError as error:
+      print(error)
+      quit()
   else:
     print('Not a supported file format.')
     quit()
@@ -0,0 +1,33 @@
+import wave
+
+import numpy as np
+
+import lpcm_to_csv
+import audio_io
+
+def write_stereo_wave(filename, left, right, rate=8000):
+    frames = np.column_stack((left, right)).astype('<i2')
+    with wave.open(filename, 'wb') as wav:
+        wav.setnchannels(2)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(frames.tobytes())
+
+def test_wave_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setattr(lpcm_to_csv, 'CHUNK_FRAMES', 7)
+    left = np.arange(-50, 50) * 300
+    right = -np.arange(-50, 50) * 100
+    expected = (left + right) / 2 / 2 ** 15
+    filename = str(tmp_path / 'stereo.wav')
+    write_stereo_wave(filename, left, right)
+
+    lpcm_to_csv.wavetocsv(filename)
+    samples, rate = audio_io.read_samples(str(tmp_path / ('stereo' + audio_io.SAMPLE_EXTENSION)))
+    assert rate == 8000 and samples.shape == (100, 1)
+    assert np.allclose(samples[:, 0], expected)
+
+    lpcm_to_csv.wavetocsv(filename, binary=False)
+    values = (tmp_path / 'stereo.csv').read_text().split(',')
+    # The converter ends the file with a zero instead of a trailing comma
+    assert values[-1] == '0'
+    assert np.allclose([float(value) for value in values[:-1]], expected)
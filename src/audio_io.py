@@ -0,0 +1,365 @@
+import os
+import struct
+import wave
+from fractions import Fraction
+
+import numpy as np
+
+try:
+    import aifc
+except ImportError:  # Removed from the standard library in Python 3.13
+    aifc = None
+
+# Binary sample file written by audio/lpcm_to_csv.py
+# Header: magic, version, channel count, sample rate and numpy dtype string,
+# followed by little-endian interleaved frames.
+SAMPLE_EXTENSION = '.smp'
+SAMPLE_MAGIC = b'RGSM'
+SAMPLE_VERSION = 1
+SAMPLE_HEADER = struct.Struct('<4sHHI4s')
+SAMPLE_DTYPES = ('<f4', '<i2')
+
+
+def write_samples(filename, samples, sample_rate):
+    """Write an array of shape (frames,) or (frames, channels) as a sample file"""
+    samples = np.asarray(samples)
+    if samples.ndim == 1:
+        samples = samples.reshape(-1, 1)
+    dtype = samples.dtype.newbyteorder('<').str
+    if dtype not in SAMPLE_DTYPES:
+        dtype = '<f4'
+    with open(filename, 'wb') as fh:
+        fh.write(SAMPLE_HEADER.pack(SAMPLE_MAGIC, SAMPLE_VERSION, samples.shape[1],
+                                    sample_rate, dtype.encode('ascii')))
+        np.ascontiguousarray(samples, dtype=dtype).tofile(fh)
+
+
+def sample_layout(filename):
+    """Channel count, sample rate, dtype and frame count of a sample file"""
+    with open(filename, 'rb') as fh:
+        header = fh.read(SAMPLE_HEADER.size)
+    if len(header) != SAMPLE_HEADER.size:
+        raise ValueError("{} is too short to be a sample file".format(filename))
+    magic, version, channels, sample_rate, dtype = SAMPLE_HEADER.unpack(header)
+    if magic != SAMPLE_MAGIC or version != SAMPLE_VERSION:
+        raise ValueError("{} is not a version {} sample file".format(filename, SAMPLE_VERSION))
+    dtype = np.dtype(dtype.rstrip(b'\0').decode('ascii'))
+
+    frames = (os.path.getsize(filename) - SAMPLE_HEADER.size) // (dtype.itemsize * channels)
+    return channels, sample_rate, dtype, frames
+
+
+def read_samples(filename):
+    """Map a sample file without copying it.
+
+    Returns a read only (frames, channels) array and the sample rate.
+    """
+    channels, sample_rate, dtype, frames = sample_layout(filename)
+    if frames == 0:
+        return np.zeros((0, channels), dtype=dtype), sample_rate
+    samples = np.memmap(filename, dtype=dtype, mode='r', offset=SAMPLE_HEADER.size,
+                        shape=(frames, channels))
+    return samples, sample_rate
+
+
+# Uncompressed PCM read directly by record_gen
+WAVE_EXTENSIONS = ('.wav', '.wave')
+AIFF_EXTENSIONS = ('.aif', '.aiff', '.aifc')
+CHUNK_FRAMES = 1 << 16
+
+
+def write_sample_blocks(filename, blocks, sample_rate):
+    """Write mono blocks of samples to a float32 sample file as they come"""
+    with open(filename, 'wb') as fh:
+        fh.write(SAMPLE_HEADER.pack(SAMPLE_MAGIC, SAMPLE_VERSION, 1, int(sample_rate), b'<f4'))
+        for block in blocks:
+            np.asarray(block, dtype='<f4').tofile(fh)
+
+
+def map_window(filename, offset, start, stop, dtype, row_shape=()):
+    """Copy rows start to stop of an array of rows stored at offset in a file.
+
+    Only those rows are mapped and the mapping is closed again, so reading a
+    file a window at a time never keeps more than one window resident.
+    """
+    dtype = np.dtype(dtype)
+    if stop <= start:
+        return np.zeros((0,) + tuple(row_shape), dtype=dtype)
+    row_bytes = dtype.itemsize * int(np.prod(row_shape, dtype=np.int64))
+    window = np.memmap(filename, dtype=dtype, mode='r', offset=offset + start * row_bytes,
+                       shape=(stop - start,) + tuple(row_shape))
+    rows = np.array(window)
+    del window
+    return rows
+
+
+class SampleWindows():
+    """Mono float32 samples of a sample file, read a window at a time.
+
+    Indexing with an int or a slice maps and downmixes only those frames,
+    so the spiral can pull the samples of one revolution at a time from a
+    file of any length.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self.channels, self.sample_rate, self.dtype, self.frames = sample_layout(filename)
+
+    def __len__(self):
+        return self.frames
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self.frames)
+            if step != 1:
+                raise ValueError("Sample windows must be contiguous")
+            rows = map_window(self.filename, SAMPLE_HEADER.size, start, stop, self.dtype,
+                              (self.channels,)).astype(np.float32)
+            return rows[:, 0] if self.channels == 1 else rows.mean(axis=1)
+        if index < 0:
+            index += self.frames
+        if not 0 <= index < self.frames:
+            raise IndexError("Sample {} out of range".format(index))
+        return self[index:index + 1][0]
+
+    def blocks(self, chunk_frames=None):
+        """The samples in consecutive blocks of chunk_frames"""
+        chunk_frames = chunk_frames or CHUNK_FRAMES
+        for start in range(0, self.frames, chunk_frames):
+            yield self[start:start + chunk_frames]
+
+
+def open_lpcm(filename):
+    """Open a wave or aiff reader based on the file extension"""
+    extension = os.path.splitext(filename)[1].lower()
+    if extension in WAVE_EXTENSIONS:
+        return wave.open(filename, 'rb')
+    if extension in AIFF_EXTENSIONS:
+        if aifc is None:
+            raise ValueError("AIFF input needs the aifc module, removed in Python 3.13")
+        return aifc.open(filename, 'rb')
+    raise ValueError("{} is not a supported audio file".format(filename))
+
+
+def _chunks(fh, size_format):
+    """Id, data offset and size of each chunk of a RIFF or IFF file after its header"""
+    header = struct.Struct(size_format)
+    while True:
+        start = fh.tell()
+        chunk = fh.read(header.size)
+        if len(chunk) < header.size:
+            return
+        chunk_id, size = header.unpack(chunk)
+        yield chunk_id, start + header.size, size
+        # Chunks are padded to an even length
+        fh.seek(start + header.size + size + size % 2)
+
+
+def lpcm_layout(filename):
+    """Where the PCM data of an uncompressed wave or aiff file is.
+
+    Returns the offset of the data, the frame count, channel count, sample
+    width, sample rate and whether the samples are big endian, or None for
+    compressed files, which have to be decoded by their reader.
+    """
+    with open_lpcm(filename) as reader:
+        channels, sample_width = reader.getnchannels(), reader.getsampwidth()
+        rate, frames = reader.getframerate(), reader.getnframes()
+        is_aiff = aifc is not None and isinstance(reader, aifc.Aifc_read)
+        if is_aiff and reader.getcomptype() != b'NONE':
+            return None
+
+    with open(filename, 'rb') as fh:
+        fh.seek(12)
+        chunks = {chunk_id: (start, size)
+                  for chunk_id, start, size in _chunks(fh, '>4sI' if is_aiff else '<4sI')}
+        if is_aiff:
+            if b'SSND' not in chunks:
+                return None
+            start, size = chunks[b'SSND']
+            fh.seek(start)
+            # Sound data starts after an offset and block size field
+            skip = struct.unpack('>I', fh.read(4))[0]
+            start, size = start + 8 + skip, size - 8 - skip
+        else:
+            if b'data' not in chunks:
+                return None
+            start, size = chunks[b'data']
+    frame_bytes = channels * sample_width
+    frames = max(0, min(frames, size // frame_bytes,
+                        (os.path.getsize(filename) - start) // frame_bytes))
+    return start, frames, channels, sample_width, rate, is_aiff
+
+
+def decode_pcm(data, sample_width, channels, big_endian=False):
+    """Decode interleaved PCM bytes to float32 frames in [-1, 1).
+
+    Returns an array of shape (frames, channels). 8 bit wave data is
+    unsigned, every other width is signed two's complement.
+    """
+    order = '>' if big_endian else '<'
+    if sample_width == 1:
+        samples = np.frombuffer(data, dtype=np.int8 if big_endian else np.uint8)
+        samples = samples.astype(np.float32) - (0 if big_endian else 128)
+    elif sample_width == 3:
+        # Widen to 32 bits with the sample in the high bytes, then shift back
+        raw = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3)
+        wide = np.zeros((len(raw), 4), dtype=np.uint8)
+        if big_endian:
+            wide[:, :3] = raw
+        else:
+            wide[:, 1:] = raw
+        samples = (wide.view(order + 'i4')[:, 0] >> 8).astype(np.float32)
+    elif sample_width in (2, 4):
+        samples = np.frombuffer(data, dtype=order + 'i' + str(sample_width)).astype(np.float32)
+    else:
+        raise ValueError("Unsupported sample width of {} bytes".format(sample_width))
+    samples /= 2 ** (8 * sample_width - 1)
+    return samples.reshape(-1, channels)
+
+
+# Zero crossings of the windowed sinc on each side of its centre
+RESAMPLE_ZEROS = 16
+RESAMPLE_BETA = 8.0
+
+
+def resample_ratio(source_rate, target_rate):
+    """Output samples per input sample, as a fraction with a small denominator"""
+    return (Fraction(target_rate) / Fraction(source_rate)).limit_denominator(1000)
+
+
+def resampled_length(length, source_rate, target_rate):
+    """Number of samples Resampler makes of length input samples"""
+    if source_rate == target_rate:
+        return length
+    ratio = resample_ratio(source_rate, target_rate)
+    return -(-length * ratio.numerator // ratio.denominator)
+
+
+class Resampler():
+    """Streaming polyphase FIR resampler from source_rate to target_rate.
+
+    The rate ratio is reduced to up / down. A Kaiser windowed sinc low pass
+    cutting off at the lower Nyquist frequency is split into up phases, and
+    only the output samples are computed, each as a dot product of one phase
+    with the latest input samples. Feeding a signal to process() in chunks
+    gives the same result as one call over the whole signal.
+    """
+    block = 1 << 14
+
+    def __init__(self, source_rate, target_rate, zeros=RESAMPLE_ZEROS, beta=RESAMPLE_BETA):
+        ratio = resample_ratio(source_rate, target_rate)
+        self.up, self.down = ratio.numerator, ratio.denominator
+        factor = max(self.up, self.down)
+        self.delay = zeros * factor
+        length = 2 * self.delay + 1
+        self.taps = -(-length // self.up)
+        h = np.zeros(self.taps * self.up)
+        h[:length] = self.up / factor * np.sinc((np.arange(length) - self.delay) / factor) \
+            * np.kaiser(length, beta)
+        # Row p holds the taps h[p + k * up], reversed to line up with the input
+        self.phases = h.reshape(self.taps, self.up).T[:, ::-1].copy()
+        # Input samples before the start of the signal are zero
+        self._buffer = np.zeros(self.taps - 1)
+        self._start = 1 - self.taps
+        self._consumed = 0
+        self._produced = 0
+
+    def _output(self, available):
+        """Compute every pending output that only needs the first available inputs"""
+        count = max(0, (available * self.up - 1 - self.delay) // self.down - self._produced + 1)
+        windows = np.lib.stride_tricks.sliding_window_view(self._buffer, self.taps)
+        out = np.empty(count, dtype=np.float32)
+        for first in range(0, count, self.block):
+            t = (self._produced + np.arange(first, min(count, first + self.block))) * self.down + self.delay
+            oldest = t // self.up - self.taps + 1
+            out[first:first + len(t)] = np.einsum(
+                'ij,ij->i', windows[oldest - self._start], self.phases[t % self.up])
+        self._produced += count
+        drop = (self._produced * self.down + self.delay) // self.up - self.taps + 1 - self._start
+        if drop > 0:
+            self._buffer = self._buffer[drop:]
+            self._start += drop
+        return out
+
+    def process(self, samples):
+        self._buffer = np.concatenate((self._buffer, samples))
+        self._consumed += len(samples)
+        return self._output(self._consumed)
+
+    def flush(self):
+        """Remaining outputs, taking the input past the end as zero"""
+        total = -(-self._consumed * self.up // self.down)
+        padding = self.delay // self.up + self.taps
+        self._buffer = np.concatenate((self._buffer, np.zeros(padding)))
+        return self._output(self._consumed + padding)[:total - self._produced]
+
+
+def resample_blocks(blocks, source_rate, target_rate):
+    """Resample a stream of blocks, see Resampler"""
+    if source_rate == target_rate:
+        for block in blocks:
+            yield np.asarray(block, dtype=np.float32)
+        return
+    resampler = Resampler(source_rate, target_rate)
+    for block in blocks:
+        yield resampler.process(block)
+    yield resampler.flush()
+
+
+def resample(samples, source_rate, target_rate):
+    """Resample a whole array, see Resampler"""
+    if source_rate == target_rate:
+        return np.asarray(samples, dtype=np.float32)
+    resampler = Resampler(source_rate, target_rate)
+    return np.concatenate((resampler.process(samples), resampler.flush()))
+
+
+def lpcm_blocks(filename, chunk_frames=CHUNK_FRAMES):
+    """Sample rate, frame count and a generator of the file as mono float32 blocks.
+
+    Blocks hold chunk_frames frames each. Uncompressed files are decoded from
+    their PCM data mapped one block at a time, see lpcm_layout, others
+    through their reader.
+    """
+    layout = lpcm_layout(filename)
+    if layout is not None:
+        offset, frames, channels, sample_width, rate, big_endian = layout
+
+        def blocks():
+            for start in range(0, frames, chunk_frames):
+                chunk = map_window(filename, offset, start, min(frames, start + chunk_frames),
+                                   np.uint8, (channels * sample_width,))
+                yield decode_pcm(chunk, sample_width, channels, big_endian).mean(axis=1)
+        return rate, frames, blocks()
+
+    reader = open_lpcm(filename)
+    big_endian = aifc is not None and isinstance(reader, aifc.Aifc_read)
+
+    def read_blocks():
+        with reader:
+            while True:
+                data = reader.readframes(chunk_frames)
+                if not data:
+                    break
+                yield decode_pcm(data, reader.getsampwidth(), reader.getnchannels(),
+                                 big_endian).mean(axis=1)
+    return reader.getframerate(), reader.getnframes(), read_blocks()
+
+
+def read_lpcm(filename, rate=None, chunk_frames=CHUNK_FRAMES):
+    """Decode a wave or aiff file in fixed size chunks.
+
+    Each chunk is downmixed to mono and, when a rate is given, resampled to
+    it, so only one chunk of frames is decoded at a time. Returns the samples
+    as float32.
+    """
+    source_rate, frames, blocks = lpcm_blocks(filename, chunk_frames)
+    if rate is not None and rate != source_rate:
+        blocks = resample_blocks(blocks, source_rate, rate)
+        frames = resampled_length(frames, source_rate, rate)
+    samples = np.empty(frames, dtype=np.float32)
+    kept = 0
+    for block in blocks:
+        samples[kept:kept + len(block)] = block
+        kept += len(block)
+    return samples[:kept]
@@ -0,0 +1,118 @@
+import numpy as np
+import pytest
+
+import audio_io
+
+def test_sample_file_round_trip(tmp_path):
+    filename = str(tmp_path / ('stereo' + audio_io.SAMPLE_EXTENSION))
+    samples = np.arange(20, dtype=np.int16).reshape(10, 2)
+    audio_io.write_samples(filename, samples, 22050)
+    loaded, rate = audio_io.read_samples(filename)
+    assert rate == 22050
+    assert loaded.dtype == np.dtype('<i2')
+    assert np.array_equal(loaded, samples)
+
+def test_sample_file_mono_float(tmp_path):
+    filename = str(tmp_path / ('mono' + audio_io.SAMPLE_EXTENSION))
+    audio_io.write_samples(filename, np.linspace(-1, 1, 5), 44100)
+    loaded, rate = audio_io.read_samples(filename)
+    assert loaded.shape == (5, 1) and loaded.dtype == np.dtype('<f4')
+    assert np.allclose(loaded[:, 0], np.linspace(-1, 1, 5))
+
+def test_sample_file_bad_header(tmp_path):
+    filename = tmp_path / 'bad.smp'
+    filename.write_bytes(b'not a sample file')
+    with pytest.raises(ValueError):
+        audio_io.read_samples(str(filename))
+
+@pytest.mark.parametrize('width', [1, 2, 3, 4])
+def test_decode_pcm_widths(width):
+    values = np.array([-1, -0.5, 0, 0.25, 0.5]) * 2 ** (8 * width - 1)
+    values = values.astype(np.int64)
+    for big_endian in (False, True):
+        order = 'big' if big_endian else 'little'
+        # 8 bit wave samples are unsigned
+        offset = 128 if width == 1 and not big_endian else 0
+        data = b''.join(int(v + offset).to_bytes(width, order, signed=offset == 0) for v in values)
+        decoded = audio_io.decode_pcm(data, width, 1, big_endian)
+        assert np.array_equal(decoded[:, 0], [-1, -0.5, 0, 0.25, 0.5])
+
+def test_read_lpcm_chunks(tmp_path):
+    import wave
+    filename = str(tmp_path / 'stereo.wav')
+    left = np.arange(1000, dtype=np.int16) * 8
+    right = -left // 2
+    with wave.open(filename, 'wb') as wav:
+        wav.setnchannels(2)
+        wav.setsampwidth(2)
+        wav.setframerate(44100)
+        wav.writeframes(np.column_stack((left, right)).astype('<i2').tobytes())
+
+    mono = (left + right) / 2 / 2 ** 15
+    samples = audio_io.read_lpcm(filename, chunk_frames=33)
+    assert samples.dtype == np.float32
+    assert np.allclose(samples, mono)
+    resampled = audio_io.read_lpcm(filename, 11025, chunk_frames=33)
+    assert np.allclose(resampled, audio_io.resample(mono, 44100, 11025), atol=1e-6)
+
+def test_resample_filters_above_nyquist():
+    t = np.arange(44100) / 44100
+    low, high = np.sin(2 * np.pi * 1000 * t), np.sin(2 * np.pi * 8000 * t)
+    resampled = audio_io.resample(low + high, 44100, 11025)
+    assert len(resampled) == 11025
+    # The 8 kHz tone would alias to 3 kHz, only the 1 kHz tone may remain
+    expected = low[::4]
+    assert np.abs(resampled - expected)[100:-100].max() < 1e-3
+
+def test_resampler_chunks_match_whole_signal():
+    signal = np.random.default_rng(0).standard_normal(5000)
+    resampler = audio_io.Resampler(48000, 11025)
+    chunks = [resampler.process(signal[i:i + 777]) for i in range(0, len(signal), 777)]
+    chunks.append(resampler.flush())
+    assert np.allclose(np.concatenate(chunks), audio_io.resample(signal, 48000, 11025))
+    assert resampler.up == 147 and resampler.down == 640
+
+def test_lpcm_layout_skips_other_chunks(tmp_path):
+    import aifc
+    import struct
+    import wave
+    frames = np.arange(-300, 300, dtype=np.int16).reshape(-1, 2) * 50
+    wav_name = str(tmp_path / 'list.wav')
+    with wave.open(wav_name, 'wb') as wav:
+        wav.setnchannels(2)
+        wav.setsampwidth(2)
+        wav.setframerate(44100)
+        wav.writeframes(frames.astype('<i2').tobytes())
+    # Put an odd sized chunk, padded to an even size, before the data chunk
+    data = open(wav_name, 'rb').read()
+    extra = b'LIST' + struct.pack('<I', 3) + b'abc\0'
+    data = data[:36] + extra + data[36:]
+    data = data[:4] + struct.pack('<I', len(data) - 8) + data[8:]
+    open(wav_name, 'wb').write(data)
+
+    aiff_name = str(tmp_path / 'stereo.aiff')
+    with aifc.open(aiff_name, 'wb') as aif:
+        aif.setnchannels(2)
+        aif.setsampwidth(2)
+        aif.setframerate(44100)
+        aif.writeframes(frames.astype('>i2').tobytes())
+
+    mono = frames.mean(axis=1) / 2 ** 15
+    for filename in (wav_name, aiff_name):
+        layout = audio_io.lpcm_layout(filename)
+        assert layout[1:5] == (len(frames), 2, 2, 44100)
+        rate, count, blocks = audio_io.lpcm_blocks(filename, 37)
+        assert (rate, count) == (44100, len(frames))
+        assert np.allclose(np.concatenate(list(blocks)), mono)
+
+def test_sample_windows_map_only_the_window(tmp_path):
+    filename = str(tmp_path / ('stereo' + audio_io.SAMPLE_EXTENSION))
+    samples = np.arange(40, dtype=np.float32).reshape(20, 2)
+    audio_io.write_samples(filename, samples, 22050)
+    windows = audio_io.SampleWindows(filename)
+    mono = samples.mean(axis=1)
+    assert len(windows) == 20 and windows.sample_rate == 22050
+    assert np.array_equal(windows[3:7], mono[3:7])
+    assert np.array_equal(windows[18:30], mono[18:])
+    assert windows[-1] == mono[-1]
+    assert np.array_equal(np.concatenate(list(windows.blocks(6))), mono)
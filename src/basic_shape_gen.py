@@ -1,27 +1,21 @@
 #!/usr/bin/python3
 
 
+import hashlib
 import os
-from math import cos, sin
 import time
 import memory_profiler
 
-# https://pypi.org/project/numpy-stl/
-from stl import mesh
-
+import numpy as np
 import trimesh as tm
+import mesh_io
 import record_globals as rg
 
 
-def circumference_generator(theta, rad, incr=rg.incrNum):
-    """Generate circumference of cylinder"""
-    while theta < rg.tau:
-        yield rad * sin(theta), rad * cos(theta)
-        theta += incr
-
 def polygon_generator(rad, edge_num):
     """Generate perimeter of polygon"""
-    return circumference_generator(0, rad, incr=rg.tau / edge_num)
+    table = rg.angle_table(edge_num, rg.tau / edge_num)
+    return zip((rad * table[:, 2]).tolist(), (rad * table[:, 1]).tolist())
 
 
 def setzpos(arr, height=0) -> tuple:
@@ -38,23 +32,27 @@ def create_polygon(rad, num, height=0):
     return lst
 
 def calculate_record_shape(
-        record_shape=tm.TriMesh(),
+        record_shape=None,
         edge_num=32,
-        info=True) -> mesh.Mesh:
+        info=True,
+        config=None) -> tm.TriMesh:
     """ Combine the vectors in to an outer and inner circle """
-    baseline = rg.record_height - 1.75
+    if record_shape is None:
+        record_shape = tm.TriMesh()
+    config = config or rg.default_config()
+    baseline = config.record_height - 1.75
 
-    outerEdgeUpper = create_polygon(rg.RADIUS, edge_num, rg.record_height)
-    outerEdgeLower = create_polygon(rg.RADIUS, edge_num)
+    outerEdgeUpper = create_polygon(config.RADIUS, edge_num, config.record_height)
+    outerEdgeLower = create_polygon(config.RADIUS, edge_num)
 
-    outerSpacerUpper = create_polygon(rg.outer_rad + 0.5, edge_num, rg.record_height)
-    outerSpacerMiddle = create_polygon(rg.outer_rad + 0.5, edge_num, baseline)
+    outerSpacerUpper = create_polygon(config.outer_rad + 0.5, edge_num, config.record_height)
+    outerSpacerMiddle = create_polygon(config.outer_rad + 0.5, edge_num, baseline)
 
-    innerSpacerUpper = create_polygon(rg.inner_rad, edge_num, rg.record_height)
-    innerSpacerMiddle = create_polygon(rg.inner_rad, edge_num, baseline)
+    innerSpacerUpper = create_polygon(config.inner_rad, edge_num, config.record_height)
+    innerSpacerMiddle = create_polygon(config.inner_rad, edge_num, baseline)
 
-    center_radius = rg.inner_hole / 2
-    centerHoleUpper = create_polygon(center_radius, edge_num, rg.record_height)
+    center_radius = config.inner_hole / 2
+    centerHoleUpper = create_polygon(center_radius, edge_num, config.record_height)
     centerHoleMiddle = create_polygon(center_radius, edge_num, baseline)
     centerHoleLower = create_polygon(center_radius, edge_num)
     
@@ -78,13 +76,50 @@ def calculate_record_shape(
     return record_shape
 
 
+# Bump when calculate_record_shape changes to invalidate cached blanks
+BLANK_VERSION = 2
+BLANK_CACHE_DIR = os.path.join('cache', 'blanks')
+_blank_cache = {}
+
+
+def blank_key(edge_num=32, config=None):
+    """Hash of every parameter the blank record depends on"""
+    config = config or rg.default_config()
+    params = (BLANK_VERSION, config.RADIUS, config.outer_rad, config.inner_rad, config.inner_hole,
+              config.record_height, edge_num)
+    return hashlib.sha256(repr(params).encode('ascii')).hexdigest()[:32]
+
+
+def record_blank(edge_num=32, cache_dir=BLANK_CACHE_DIR, config=None) -> tm.TriMesh:
+    """Copy of the blank record, built at most once per set of parameters.
+
+    Blanks are kept in memory and, unless cache_dir is None, as .npz files
+    of their vertex and face arrays shared between processes.
+    """
+    key = blank_key(edge_num, config)
+    if key not in _blank_cache:
+        path = None if cache_dir is None else os.path.join(cache_dir, key + '.npz')
+        if path is not None and os.path.isfile(path):
+            with np.load(path) as arrays:
+                blank = tm.TriMesh.from_arrays(arrays['vertices'], arrays['faces'], welded=True)
+        else:
+            blank = calculate_record_shape(edge_num=edge_num, info=False, config=config)
+            blank.weld()
+            if path is not None:
+                mesh_io.save_npz_atomic(path, vertices=blank.vertices, faces=blank.faces)
+        _blank_cache[key] = blank
+    return _blank_cache[key].copy()
+
+
 def main():
-    filename = str(rg.RPM) + '_disc.stl'
+    config = rg.default_config()
+    filename = str(config.RPM) + '_disc.stl'
     print('Generating blank record.')
-    record_trimesh = calculate_record_shape()
-    record_trimesh.remove_duplicate_faces()
-    record_trimesh.remove_empty_faces()
-    record_trimesh.is_manifold()
+    record_trimesh = calculate_record_shape(config=config)
+    print("Vertices welded: {}".format(record_trimesh.weld(config.weld_tolerance)))
+    duplicate, empty = record_trimesh.clean()
+    print("Faces removed: {} duplicate, {} empty".format(duplicate, empty))
+    print("Mesh check: {}".format(record_trimesh.validate()))
 
     # Save mesh for debugging purposes
     if not os.path.isdir('stl'):
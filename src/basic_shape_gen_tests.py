@@ -0,0 +1,42 @@
+import os
+
+import numpy as np
+
+import basic_shape_gen
+import record_globals as rg
+
+def test_calculate_record_shape_is_fresh():
+    first = basic_shape_gen.calculate_record_shape(info=False)
+    second = basic_shape_gen.calculate_record_shape(info=False)
+    assert len(first) == len(second) == 576
+
+def test_record_blank_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(basic_shape_gen, '_blank_cache', {})
+    cache_dir = str(tmp_path)
+    blank = basic_shape_gen.record_blank(cache_dir=cache_dir)
+    path = os.path.join(cache_dir, basic_shape_gen.blank_key() + '.npz')
+    assert os.path.isfile(path)
+
+    # Copies are independent of the cached blank
+    blank.add_face([(0, 0, 0), (1, 0, 0), (0, 1, 0)])
+    again = basic_shape_gen.record_blank(cache_dir=cache_dir)
+    assert len(again) == len(blank) - 1
+
+    # A new process would load the blank from disk
+    monkeypatch.setattr(basic_shape_gen, '_blank_cache', {})
+    loaded = basic_shape_gen.record_blank(cache_dir=cache_dir)
+    assert np.array_equal(loaded.get_vertices(), again.get_vertices())
+    assert np.array_equal(loaded.get_faces_by_index(), again.get_faces_by_index())
+    assert basic_shape_gen.blank_key(16) != basic_shape_gen.blank_key(32)
+    # The blank does not depend on the steps of the spiral
+    config = rg.default_config()
+    coarse = config.replace(DOWNSAMPLING=config.DOWNSAMPLING * 8)
+    assert coarse.incrNum != config.incrNum
+    assert basic_shape_gen.blank_key(config=coarse) == basic_shape_gen.blank_key(config=config)
+
+def test_create_polygon_closes_for_any_edge_count():
+    for edge_num in (3, 32, 64, 100, 257):
+        polygon = basic_shape_gen.create_polygon(10.0, edge_num, 1.5)
+        assert len(polygon) == edge_num + 1
+        assert polygon[0] == polygon[-1]
+        assert np.allclose([np.hypot(v.x, v.y) for v in polygon], 10.0)
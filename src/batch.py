@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+
+"""Engrave many audio files in one run.
+
+The manifest is a JSON list of records. Each record is either the name of an
+audio file or an object like
+
+    {"audio": "audio/side_a.wav", "stl": "side_a", "format": "3mf",
+     "overrides": {"Audio": {"rpm": 45}}}
+
+where format is that of the mesh, stl unless given, and overrides replace
+options of record_constants.ini for that record only.
+A manifest may also be an object with a "records" list and "overrides"
+shared by all of them. The constants file is read once and each record
+gets its own rg.RecordConfig. Records are engraved by a bounded pool of
+worker processes, each of which imports the modules once and keeps the
+blank records it has built for the records after.
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import instrument
+import record_globals as rg
+import record_gen
+
+
+def default_stlname(audio):
+    return os.path.splitext(os.path.basename(audio))[0] + "_engraved"
+
+
+def load_manifest(filename):
+    """List of jobs, dicts of audio, stl, format and overrides, in a manifest file"""
+    with open(filename) as fh:
+        manifest = json.load(fh)
+    shared = {}
+    if isinstance(manifest, dict):
+        shared = manifest.get('overrides', {})
+        manifest = manifest['records']
+
+    jobs = []
+    for record in manifest:
+        if isinstance(record, str):
+            record = {'audio': record}
+        if 'audio' not in record:
+            raise ValueError("Record without an audio file in {}: {}".format(filename, record))
+        overrides = {section: dict(options) for section, options in shared.items()}
+        for section, options in record.get('overrides', {}).items():
+            overrides.setdefault(section, {}).update(options)
+        jobs.append({'audio': record['audio'],
+                     'stl': record.get('stl') or default_stlname(record['audio']),
+                     'format': record.get('format', 'stl'),
+                     'overrides': overrides})
+    return jobs
+
+
+def run_job(job, config):
+    """Engrave one record to config and return how long it and each of
+    its stages took.
+
+    A failing record is reported in the result rather than raised, so it
+    does not stop the rest of the batch.
+    """
+    result = {'audio': job['audio'], 'stl': job['stl'], 'format': job.get('format', 'stl')}
+    tracer = instrument.Tracer()
+    start = time.perf_counter()
+    try:
+        result['triangles'] = record_gen.main(job['audio'], job['stl'], mesh_format=job.get('format', 'stl'),
+                                              config=config, tracer=tracer)
+    except Exception as error:
+        result['error'] = "{}: {}".format(type(error).__name__, error)
+    result['seconds'] = time.perf_counter() - start
+    result['stages'] = tracer.summary()
+    return result
+
+
+def format_result(result):
+    if 'error' in result:
+        return "{audio}: failed after {seconds:.2f} s, {error}".format(**result)
+    return "{audio}: {triangles} triangles in {seconds:.2f} s to stl/{stl}.{format}".format(**result)
+
+
+def run_batch(jobs, workers=None, info=True, constants=rg.CONSTANTS_FILE):
+    """Run the jobs on at most workers processes, in one process if workers is 1.
+
+    Each job is engraved to the constants file with its overrides applied.
+    Returns a result for each job, in the order of the jobs.
+    """
+    os.makedirs('stl', exist_ok=True)
+    options = rg.read_constants(constants)
+    configs = [rg.RecordConfig.from_constants(options, job.get('overrides')) for job in jobs]
+    workers = min(workers or os.cpu_count() or 1, max(1, len(jobs)))
+    results = []
+    if workers == 1:
+        outcomes = map(run_job, jobs, configs)
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        outcomes = executor.map(run_job, jobs, configs)
+    try:
+        for result in outcomes:
+            if info:
+                print(format_result(result))
+            results.append(result)
+    finally:
+        if workers > 1:
+            executor.shutdown()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Engrave every record in a JSON manifest")
+    parser.add_argument("manifest")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="number of records engraved at once, defaults to the CPU count")
+    parser.add_argument("-o", "--output", help="write the results as JSON here")
+    parser.add_argument("--constants", default=rg.CONSTANTS_FILE,
+                        help="record constants file, " + rg.CONSTANTS_FILE + " unless given")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    results = run_batch(load_manifest(args.manifest), args.jobs, constants=args.constants)
+    failed = sum('error' in result for result in results)
+    print("{} records in {:.2f} s, {} failed".format(len(results), time.perf_counter() - start, failed))
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(results, fh, indent=2)
+            fh.write('\n')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,37 @@
+import json
+import os
+
+import numpy as np
+
+import audio_io
+import batch
+import record_globals as rg
+
+
+def test_load_manifest(tmp_path):
+    manifest = tmp_path / 'records.json'
+    manifest.write_text(json.dumps({
+        'overrides': {'Audio': {'rpm': 45}},
+        'records': ['audio/a.wav',
+                    {'audio': 'audio/b.smp', 'stl': 'b',
+                     'overrides': {'Audio': {'downsampling': 2}}}]}))
+    first, second = batch.load_manifest(str(manifest))
+    assert first == {'audio': 'audio/a.wav', 'stl': 'a_engraved', 'format': 'stl',
+                     'overrides': {'Audio': {'rpm': 45}}}
+    assert second['stl'] == 'b'
+    assert second['overrides'] == {'Audio': {'rpm': 45, 'downsampling': 2}}
+
+
+def test_run_batch(tmp_path, monkeypatch):
+    constants = os.path.abspath(rg.CONSTANTS_FILE)
+    monkeypatch.chdir(tmp_path)
+    samples = 0.5 * np.sin(np.arange(2 * rg.samplingRate) * 0.05)
+    audio_io.write_samples('short.smp', samples.astype(np.float32), rg.samplingRate)
+    jobs = [{'audio': 'short.smp', 'stl': 'short', 'overrides': {}},
+            {'audio': 'missing.smp', 'stl': 'missing', 'overrides': {}}]
+    done, failed = batch.run_batch(jobs, workers=1, info=False, constants=constants)
+    assert done['triangles'] > 0 and done['seconds'] > 0
+    assert [stage['name'] for stage in done['stages']] == ['read', 'blank', 'spiral', 'cleanup', 'save']
+    assert done['stages'][-1]['items'] == done['triangles']
+    assert (tmp_path / 'stl' / 'short.stl').is_file()
+    assert 'error' in failed
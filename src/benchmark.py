@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+
+"""Time every stage of record generation on synthetic audio.
+
+The stages are those record_gen.main runs, the spiral streamed to an STL
+writer as it is drawn. Writes a JSON report with the seconds and throughput of
+each stage and the peak resident memory of the process when it ended, the
+high-water mark of every stage so far. Pass an earlier report with --baseline
+to compare against it.
+"""
+
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+import wave
+
+import numpy as np
+
+import record_globals as rg
+import trimesh as tm
+import audio_io
+import mesh_io
+from basic_shape_gen import calculate_record_shape
+from record_gen import draw_grooves, normalize_groove
+
+SIGNALS = ('sine', 'triangle')
+
+
+def synthetic_signal(kind, seconds, rate, frequency=440.0):
+    """Sine or triangle wave in [-1, 1], like the fixtures in audio/"""
+    phase = frequency * np.arange(int(seconds * rate)) / rate
+    if kind == 'sine':
+        return np.sin(2 * np.pi * phase)
+    if kind == 'triangle':
+        return 2 * np.abs(2 * (phase % 1) - 1) - 1
+    raise ValueError("Unknown signal {}".format(kind))
+
+
+def write_wave(filename, signal, rate, channels=2):
+    """Write a 16 bit wave file with the signal on every channel"""
+    frames = np.repeat(np.round(signal * 32767).astype('<i2'), channels)
+    with wave.open(filename, 'wb') as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(frames.tobytes())
+
+
+def peak_rss_mb():
+    """Most memory the process has held resident so far"""
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2 ** 20
+
+
+class Stages():
+    """Collects the timing of each stage run through it"""
+    def __init__(self):
+        self.results = []
+
+    def run(self, name, unit, func, items=len):
+        """Run func and time it. items is the number of things it processed,
+        or a function of its return value giving that number"""
+        start = time.perf_counter()
+        value = func()
+        seconds = time.perf_counter() - start
+        if callable(items):
+            items = items(value)
+        self.results.append({
+            'stage': name,
+            'seconds': seconds,
+            'items': int(items),
+            'unit': unit,
+            'throughput': items / seconds if seconds > 0 else None,
+            'process_peak_rss_mb': peak_rss_mb(),
+        })
+        return value
+
+
+def run_benchmark(seconds, kind='sine', directory=None, config=None):
+    """Run the pipeline on seconds of a synthetic signal and return the report.
+
+    Files are written to directory, or to a temporary directory removed
+    afterwards unless one is given.
+    """
+    if directory is None:
+        with tempfile.TemporaryDirectory(prefix='record_bench') as scratch:
+            return run_benchmark(seconds, kind, scratch, config)
+    config = config or rg.default_config()
+    wav_name = os.path.join(directory, kind + '.wav')
+    stl_name = os.path.join(directory, kind + '.stl')
+    write_wave(wav_name, synthetic_signal(kind, seconds, config.samplingRate), config.samplingRate)
+    stages = Stages()
+
+    samples = stages.run('decode', 'samples/s', lambda: audio_io.read_lpcm(wav_name))
+    groove = stages.run('resample', 'samples/s',
+                        lambda: audio_io.resample(samples, config.samplingRate, config.groove_rate),
+                        len(samples))
+    groove = stages.run('normalize', 'samples/s',
+                        lambda: normalize_groove(groove, config))
+    blank = stages.run('blank', 'triangles/s',
+                       lambda: calculate_record_shape(tm.TriMesh(), info=False, config=config))
+    with mesh_io.StlWriter(stl_name, kind) as stl_file:
+        # Like record_gen.main, the revolutions go to the file as they are
+        # drawn and only the blank and caps are cleaned up and saved after
+        shape = stages.run('spiral', 'triangles/s',
+                           lambda: draw_grooves(groove, config.outer_rad, blank, info=False,
+                                                sink=stl_file, config=config),
+                           lambda _: len(stl_file))
+        stages.run('weld', 'vertices/s', lambda: shape.weld(config.weld_tolerance),
+                   lambda removed: len(shape.vertices) + removed)
+        stages.run('dedup', 'triangles/s', shape.clean, len(shape))
+
+        def save():
+            stl_file.merge(shape)
+            stl_file.close()
+        stages.run('save', 'triangles/s', save, len(shape))
+
+    return {
+        'signal': kind,
+        'seconds_of_audio': seconds,
+        'sampling_rate': config.samplingRate,
+        'groove_rate': config.groove_rate,
+        'triangles': len(stl_file),
+        'stages': stages.results,
+    }
+
+
+def compare(report, baseline):
+    """Ratio of the time of every stage to the same stage of the baseline"""
+    before = {stage['stage']: stage['seconds'] for stage in baseline['stages']}
+    return {stage['stage']: stage['seconds'] / before[stage['stage']]
+            for stage in report['stages'] if before.get(stage['stage'])}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-s', '--seconds', type=float, default=10,
+                        help="length of the synthetic audio")
+    parser.add_argument('--signal', choices=SIGNALS, default='sine')
+    parser.add_argument('-o', '--output', help="write the JSON report here")
+    parser.add_argument('--baseline', help="JSON report of an earlier run")
+    parser.add_argument('--max-slowdown', type=float, default=1.25,
+                        help="fail when a stage takes this much longer than the baseline")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.seconds, args.signal)
+    slow = []
+    if args.baseline:
+        with open(args.baseline) as fh:
+            report['ratio_to_baseline'] = compare(report, json.load(fh))
+        slow = [stage for stage, ratio in report['ratio_to_baseline'].items()
+                if ratio > args.max_slowdown]
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as fh:
+            fh.write(text + '\n')
+    print(text)
+    if slow:
+        print("Slower than baseline: " + ", ".join(slow))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
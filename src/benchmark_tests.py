@@ -0,0 +1,23 @@
+import numpy as np
+
+import benchmark
+
+def test_synthetic_signals():
+    for kind in benchmark.SIGNALS:
+        signal = benchmark.synthetic_signal(kind, 0.1, rate=1000, frequency=10)
+        assert len(signal) == 100
+        assert np.isclose(signal.max(), 1, atol=0.05) and np.isclose(signal.min(), -1, atol=0.05)
+
+def test_run_benchmark(tmp_path):
+    report = benchmark.run_benchmark(0.5, 'triangle', str(tmp_path))
+    stages = [stage['stage'] for stage in report['stages']]
+    assert stages == ['decode', 'resample', 'normalize', 'blank', 'spiral',
+                      'weld', 'dedup', 'save']
+    assert all(stage['items'] > 0 and stage['process_peak_rss_mb'] > 0 for stage in report['stages'])
+    assert set(benchmark.compare(report, report).values()) == {1.0}
+
+def test_run_benchmark_removes_its_directory(monkeypatch, tmp_path):
+    import tempfile
+    monkeypatch.setattr(tempfile, 'tempdir', str(tmp_path))
+    benchmark.run_benchmark(0.5)
+    assert list(tmp_path.iterdir()) == []
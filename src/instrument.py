@@ -0,0 +1,98 @@
+"""Spans and progress hooks around the stages of record generation.
+
+A Tracer times the spans opened with it, with the number of items each one
+processed and the memory blocks it left allocated, and passes every finished
+span and progress event to its hooks. A tracer without hooks only records
+its spans, so reporting costs nothing unless asked for. trace() returns the
+spans in the Chrome trace event format, shown as a timeline by
+chrome://tracing and Perfetto.
+"""
+
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+
+class Span():
+    """One timed stage. Set items while it runs to record what it processed"""
+    __slots__ = ('name', 'start', 'seconds', 'items', 'allocated_blocks', 'fields')
+
+    def __init__(self, name, items=None, fields=None):
+        self.name = name
+        self.items = items
+        self.fields = fields or {}
+        self.start = self.seconds = 0.0
+        self.allocated_blocks = 0
+
+    def record(self):
+        """The span as a dict, with the throughput of its items"""
+        record = dict(self.fields, name=self.name, seconds=self.seconds, items=self.items,
+                      allocated_blocks=self.allocated_blocks)
+        if self.items is not None and self.seconds > 0:
+            record['throughput'] = self.items / self.seconds
+        return record
+
+
+class Tracer():
+    """Records spans and hands them and progress events to its hooks.
+
+    Hooks are called as hook(kind, record) where kind is 'span' or
+    'progress' and record a dict, see Span.record and progress.
+    """
+    def __init__(self, hooks=()):
+        self.hooks = list(hooks)
+        self.spans = []
+        self.origin = time.perf_counter()
+
+    @contextmanager
+    def span(self, name, items=None, **fields):
+        """Time the body of a with block as a span named name"""
+        span = Span(name, items, fields)
+        blocks = sys.getallocatedblocks()
+        span.start = time.perf_counter()
+        try:
+            yield span
+        finally:
+            span.seconds = time.perf_counter() - span.start
+            span.allocated_blocks = sys.getallocatedblocks() - blocks
+            self.spans.append(span)
+            self.emit('span', span.record())
+
+    def progress(self, name, done, total=None, **fields):
+        """Report that done of total items of name are finished"""
+        if self.hooks:
+            self.emit('progress', dict(fields, name=name, done=done, total=total))
+
+    def emit(self, kind, record):
+        for hook in self.hooks:
+            hook(kind, record)
+
+    def summary(self):
+        """Records of the finished spans, in the order they finished"""
+        return [span.record() for span in self.spans]
+
+    def trace(self):
+        """The spans as complete events of the Chrome trace event format"""
+        events = [{'name': span.name, 'ph': 'X', 'pid': os.getpid(), 'tid': 0,
+                   'ts': (span.start - self.origin) * 1e6, 'dur': span.seconds * 1e6,
+                   'args': {key: value for key, value in span.record().items()
+                            if key not in ('name', 'seconds')}}
+                  for span in self.spans]
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def write(self, filename):
+        """Write trace() to a JSON file"""
+        with open(filename, 'w') as fh:
+            json.dump(self.trace(), fh, indent=1)
+            fh.write('\n')
+
+
+def print_progress(kind, record):
+    """Hook printing progress events and finished spans"""
+    if kind == 'progress':
+        print("{}: {}".format(record['name'], record['done']))
+    else:
+        items = "" if record['items'] is None else ", {} items".format(record['items'])
+        print("{}: {:.2f} s{}".format(record['name'], record['seconds'], items))
@@ -0,0 +1,41 @@
+import json
+
+import instrument
+
+
+def test_spans_record_items_and_nesting():
+    events = []
+    tracer = instrument.Tracer([lambda kind, record: events.append((kind, record))])
+    with tracer.span('outer', unit='things') as outer:
+        with tracer.span('inner', items=3):
+            pass
+        tracer.progress('step', 1, 2)
+        outer.items = 10
+    assert [span.name for span in tracer.spans] == ['inner', 'outer']
+    assert [kind for kind, _ in events] == ['span', 'progress', 'span']
+    record = events[-1][1]
+    assert record['items'] == 10 and record['unit'] == 'things'
+    assert record['seconds'] >= tracer.spans[0].seconds
+    assert 'allocated_blocks' in record
+
+def test_span_recorded_when_body_raises():
+    tracer = instrument.Tracer()
+    try:
+        with tracer.span('failing'):
+            raise ValueError()
+    except ValueError:
+        pass
+    assert [record['name'] for record in tracer.summary()] == ['failing']
+
+def test_trace_is_chrome_json(tmp_path):
+    tracer = instrument.Tracer()
+    with tracer.span('stage', items=5):
+        pass
+    filename = str(tmp_path / 'trace.json')
+    tracer.write(filename)
+    with open(filename) as fh:
+        events = json.load(fh)['traceEvents']
+    assert len(events) == 1
+    event = events[0]
+    assert event['ph'] == 'X' and event['name'] == 'stage'
+    assert event['ts'] >= 0 and event['dur'] >= 0 and event['args']['items'] == 5
@@ -0,0 +1,291 @@
+import os
+import shutil
+import struct
+import tempfile
+import zipfile
+from xml.sax.saxutils import escape
+
+import numpy as np
+# https://pypi.org/project/numpy-stl/
+from stl import mesh
+
+from trimesh import triangle_normals
+
+# Binary STL: 80 byte header, uint32 triangle count, then one record per triangle
+HEADER_SIZE = 80
+COUNT_FORMAT = '<I'
+
+
+def header_name(name):
+    """name as ASCII bytes for a file header, other characters replaced by ?"""
+    return name.encode('ascii', errors='replace')
+
+
+def write_stl_header(fh, name, count):
+    fh.write(header_name(name)[:HEADER_SIZE].ljust(HEADER_SIZE, b' '))
+    fh.write(struct.pack(COUNT_FORMAT, count))
+
+
+def map_stl(filename, count, name='record_generator'):
+    """Create a binary STL of count triangles and return its records as a
+    writable np.memmap, to be filled by TriMesh.trimesh_to_npmesh(data=...)"""
+    with open(filename, 'wb') as fh:
+        write_stl_header(fh, name, count)
+        fh.truncate(HEADER_SIZE + struct.calcsize(COUNT_FORMAT) + count * mesh.Mesh.dtype.itemsize)
+    return np.memmap(filename, dtype=mesh.Mesh.dtype, mode='r+',
+                     offset=HEADER_SIZE + struct.calcsize(COUNT_FORMAT), shape=(count,))
+
+
+def stl_records(vectors):
+    """Binary STL records, normals and corners, of an (n, 3, 3) array of
+    triangle corners"""
+    vectors = np.asarray(vectors).reshape(-1, 3, 3)
+    records = np.zeros(len(vectors), dtype=mesh.Mesh.dtype)
+    records['vectors'] = vectors
+    records['normals'] = triangle_normals(vectors)
+    return records
+
+
+class StlWriter():
+    """Binary STL file written one chunk of triangles at a time.
+
+    Triangles are appended as they are produced and the count in the header
+    is patched when the file is closed, so the full mesh is never held in
+    memory. merge() mirrors TriMesh.merge so a writer can stand in for the
+    mesh a generator draws into.
+    """
+    def __init__(self, filename, name='record_generator'):
+        self.filename = filename
+        self.count = 0
+        self._file = open(filename, 'wb')
+        write_stl_header(self._file, name, 0)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def write_vectors(self, vectors):
+        """Append an (n, 3, 3) array of triangle corners"""
+        self.write_records(stl_records(vectors))
+
+    def write_records(self, records):
+        """Append finished records, see stl_records"""
+        records.tofile(self._file)
+        self.count += len(records)
+
+    def merge(self, trimesh):
+        if len(trimesh):
+            self.write_vectors(trimesh.vertices[trimesh.faces])
+        return self
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._file.seek(HEADER_SIZE)
+        self._file.write(struct.pack(COUNT_FORMAT, self.count))
+        self._file.close()
+
+
+class _IndexedWriter():
+    """Base of the writers of formats holding a vertex list and then a face
+    list. Vertices go straight to the output as each mesh is merged, faces
+    are spooled to a temporary file and copied after the last vertex on
+    close. Vertices are shared within each merged mesh, not between them.
+    """
+    # Faces copied from the spool at a time
+    chunk = 1 << 16
+    face_dtype = np.dtype('<i4')
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.vertex_count = 0
+        self.count = 0
+        self._spool = tempfile.TemporaryFile()
+        self._closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def write_arrays(self, vertices, faces):
+        """Append (n, 3) vertices and (m, 3) faces indexing them"""
+        faces = np.asarray(faces).reshape(-1, 3) + self.vertex_count
+        self._write_vertices(np.asarray(vertices, dtype=np.float32).reshape(-1, 3))
+        self._spool_faces(faces)
+        self.vertex_count += len(vertices)
+        self.count += len(faces)
+
+    def merge(self, trimesh):
+        if len(trimesh):
+            self.write_arrays(trimesh.vertices, trimesh.faces)
+        return self
+
+    def _spool_faces(self, faces):
+        np.ascontiguousarray(faces, dtype=self.face_dtype).tofile(self._spool)
+
+    def _spooled_faces(self):
+        """Spooled faces in chunks of at most self.chunk rows"""
+        self._spool.seek(0)
+        while True:
+            data = self._spool.read(self.chunk * 3 * self.face_dtype.itemsize)
+            if not data:
+                break
+            yield np.frombuffer(data, dtype=self.face_dtype).reshape(-1, 3)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._finish()
+        finally:
+            self._spool.close()
+
+
+# Binary PLY, the counts are zero padded so they can be patched on close
+PLY_COUNT_WIDTH = 10
+PLY_HEADER = ("ply\n"
+              "format binary_little_endian 1.0\n"
+              "comment {name}\n"
+              "element vertex {vertices:0{width}d}\n"
+              "property float x\n"
+              "property float y\n"
+              "property float z\n"
+              "element face {faces:0{width}d}\n"
+              "property list uchar int vertex_indices\n"
+              "end_header\n")
+PLY_FACE_DTYPE = np.dtype([('count', 'u1'), ('vertices', '<i4', (3,))])
+
+
+class PlyWriter(_IndexedWriter):
+    """Indexed binary little endian PLY written one mesh at a time"""
+    face_dtype = PLY_FACE_DTYPE
+
+    def __init__(self, filename, name='record_generator'):
+        super().__init__(filename)
+        self._name = name
+        self._file = open(filename, 'wb')
+        self._file.write(self._header())
+
+    def _header(self):
+        # The comment has to stay on one line of the ASCII header
+        name = header_name(' '.join(self._name.split())).decode('ascii')
+        return PLY_HEADER.format(name=name, vertices=self.vertex_count, faces=self.count,
+                                 width=PLY_COUNT_WIDTH).encode('ascii')
+
+    def _write_vertices(self, vertices):
+        vertices.astype('<f4').tofile(self._file)
+
+    def _spool_faces(self, faces):
+        # Spool finished face records, closing only has to copy them
+        records = np.empty(len(faces), dtype=PLY_FACE_DTYPE)
+        records['count'] = 3
+        records['vertices'] = faces
+        records.tofile(self._spool)
+
+    def _finish(self):
+        with self._file:
+            self._spool.seek(0)
+            shutil.copyfileobj(self._spool, self._file)
+            self._file.seek(0)
+            self._file.write(self._header())
+
+
+# 3MF is a zip package of an XML model and the parts describing it
+THREEMF_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" '
+    'ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="model" '
+    'ContentType="application/vnd.ms-package.3dmanufacturing-3dmodel+xml"/>'
+    '</Types>\n')
+THREEMF_RELS = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Target="/3D/3dmodel.model" Id="rel0" '
+    'Type="http://schemas.microsoft.com/3dmanufacturing/2013/01/3dmodel"/>'
+    '</Relationships>\n')
+THREEMF_MODEL = '3D/3dmodel.model'
+THREEMF_MODEL_START = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<model unit="millimeter" xml:lang="en-US" '
+    'xmlns="http://schemas.microsoft.com/3dmanufacturing/core/2015/02">\n'
+    '<metadata name="Title">{name}</metadata>\n'
+    '<resources><object id="1" type="model"><mesh>\n<vertices>\n')
+THREEMF_MODEL_MIDDLE = '</vertices>\n<triangles>\n'
+THREEMF_MODEL_END = ('</triangles>\n</mesh></object></resources>\n'
+                     '<build><item objectid="1"/></build>\n</model>\n')
+# Fastest deflate, the model text still shrinks to about a quarter
+THREEMF_COMPRESSLEVEL = 1
+THREEMF_VERTEX = '<vertex x="%.6f" y="%.6f" z="%.6f"/>\n'
+THREEMF_TRIANGLE = '<triangle v1="%d" v2="%d" v3="%d"/>\n'
+
+
+class ThreeMfWriter(_IndexedWriter):
+    """3MF package whose model is deflated into the zip as it is written"""
+    def __init__(self, filename, name='record_generator'):
+        super().__init__(filename)
+        self._zip = zipfile.ZipFile(filename, 'w', zipfile.ZIP_DEFLATED,
+                                    compresslevel=THREEMF_COMPRESSLEVEL)
+        self._zip.writestr('[Content_Types].xml', THREEMF_CONTENT_TYPES)
+        self._zip.writestr('_rels/.rels', THREEMF_RELS)
+        self._model = self._zip.open(THREEMF_MODEL, 'w', force_zip64=True)
+        self._write(THREEMF_MODEL_START.format(name=escape(name)))
+
+    def _write(self, text):
+        self._model.write(text.encode('utf-8'))
+
+    def _write_rows(self, row_format, rows):
+        # One format call for the whole chunk, repeating the row format for
+        # every row, is about twice as fast as formatting row by row, and
+        # faster than np.savetxt, which formats row by row itself
+        self._model.write(((row_format * len(rows)) % tuple(rows.ravel().tolist())).encode('ascii'))
+
+    def _write_vertices(self, vertices):
+        for start in range(0, len(vertices), self.chunk):
+            self._write_rows(THREEMF_VERTEX, vertices[start:start + self.chunk])
+
+    def _finish(self):
+        try:
+            self._write(THREEMF_MODEL_MIDDLE)
+            for faces in self._spooled_faces():
+                self._write_rows(THREEMF_TRIANGLE, faces)
+            self._write(THREEMF_MODEL_END)
+        finally:
+            self._model.close()
+            self._zip.close()
+
+
+WRITERS = {'.stl': StlWriter, '.ply': PlyWriter, '.3mf': ThreeMfWriter}
+
+
+def open_writer(filename, name='record_generator'):
+    """Streaming writer for the format given by the extension of filename"""
+    extension = os.path.splitext(filename)[1].lower()
+    if extension not in WRITERS:
+        raise ValueError("{} is not a supported mesh format, use one of {}".format(
+            filename, ", ".join(sorted(WRITERS))))
+    return WRITERS[extension](filename, name)
+
+
+def save_npz_atomic(path, **arrays):
+    """Save arrays to the .npz file path, creating its directory.
+
+    The arrays are written to a file of this process first and renamed to
+    path, so processes sharing a cache never read a partial file.
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    partial = '{}.{}.tmp.npz'.format(path[:-4], os.getpid())
+    np.savez(partial, **arrays)
+    os.replace(partial, path)
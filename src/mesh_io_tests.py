@@ -0,0 +1,91 @@
+import numpy as np
+from stl import mesh
+
+import mesh_io
+from trimesh import TriMesh, Vertex
+
+def pyramid():
+    trimesh = TriMesh()
+    vertices = [Vertex(1, 0, 0), Vertex(-1, 0, 0), Vertex(0, 1, 0), Vertex(0, -1, 0), Vertex(0, 0, 1)]
+    faces = [(0, 2, 3), (1, 2, 3), (0, 2, 4), (1, 2, 4), (0, 3, 4), (1, 3, 4)]
+    trimesh.add_vertices(vertices)
+    trimesh.add_faces_by_index(faces)
+    return trimesh
+
+#Generated mesh saved to "stl/streamtest.stl"
+def test_stl_writer_streams_chunks():
+    trimesh = pyramid()
+    with mesh_io.StlWriter('stl/streamtest.stl') as stl_file:
+        stl_file.merge(trimesh)
+        stl_file.merge(TriMesh())
+        stl_file.merge(trimesh)
+    assert len(stl_file) == 12
+
+    saved = mesh.Mesh.from_file('stl/streamtest.stl')
+    expected = trimesh.trimesh_to_npmesh().vectors
+    assert np.allclose(saved.vectors, np.concatenate((expected, expected)))
+
+def test_stl_writer_takes_non_ascii_names():
+    with mesh_io.StlWriter('stl/streamtest.stl', 'Café') as stl_file:
+        stl_file.merge(pyramid())
+    with open('stl/streamtest.stl', 'rb') as fh:
+        assert fh.read(5) == b'Caf? '
+    assert len(mesh.Mesh.from_file('stl/streamtest.stl')) == 6
+
+#Generated mesh saved to "stl/memmaptest.stl"
+def test_map_stl():
+    trimesh = pyramid()
+    data = mesh_io.map_stl('stl/memmaptest.stl', len(trimesh))
+    trimesh.trimesh_to_npmesh(data=data)
+    data.flush()
+    del data
+
+    saved = mesh.Mesh.from_file('stl/memmaptest.stl')
+    assert np.allclose(saved.vectors, trimesh.get_vertices()[trimesh.get_faces_by_index()])
+
+def read_ply(filename):
+    with open(filename, 'rb') as fh:
+        header = []
+        while not header or header[-1] != 'end_header':
+            header.append(fh.readline().decode('ascii').strip())
+        counts = [int(line.split()[-1]) for line in header if line.startswith('element')]
+        vertices = np.fromfile(fh, dtype='<f4', count=3 * counts[0]).reshape(-1, 3)
+        faces = np.fromfile(fh, dtype=mesh_io.PLY_FACE_DTYPE, count=counts[1])
+        assert fh.read() == b''
+    assert np.all(faces['count'] == 3)
+    return vertices, faces['vertices']
+
+def read_3mf(filename):
+    import zipfile
+    from xml.etree import ElementTree
+    with zipfile.ZipFile(filename) as package:
+        assert '[Content_Types].xml' in package.namelist()
+        model = ElementTree.fromstring(package.read(mesh_io.THREEMF_MODEL))
+    ns = '{http://schemas.microsoft.com/3dmanufacturing/core/2015/02}'
+    vertices = [[float(v.get(axis)) for axis in 'xyz'] for v in model.iter(ns + 'vertex')]
+    faces = [[int(t.get(key)) for key in ('v1', 'v2', 'v3')] for t in model.iter(ns + 'triangle')]
+    return np.array(vertices), np.array(faces)
+
+#Generated meshes saved to "stl/streamtest.ply" and "stl/streamtest.3mf"
+def test_indexed_writers_stream_chunks():
+    trimesh = pyramid()
+    expected = trimesh.trimesh_to_npmesh().vectors
+    for filename, read in (('stl/streamtest.ply', read_ply), ('stl/streamtest.3mf', read_3mf)):
+        with mesh_io.open_writer(filename) as writer:
+            # Copy the spooled faces in several chunks
+            writer.chunk = 5
+            writer.merge(trimesh)
+            writer.merge(TriMesh())
+            writer.merge(trimesh)
+        assert len(writer) == 12
+        vertices, faces = read(filename)
+        assert len(vertices) == 10
+        assert np.allclose(vertices[faces], np.concatenate((expected, expected)), atol=1e-6)
+
+def test_ply_writer_takes_non_ascii_names():
+    with mesh_io.PlyWriter('stl/streamtest.ply', 'Café\nmix') as writer:
+        writer.merge(pyramid())
+    with open('stl/streamtest.ply', 'rb') as fh:
+        assert b'comment Caf? mix\n' in fh.read(200)
+    vertices, faces = read_ply('stl/streamtest.ply')
+    assert len(faces) == 6
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+
+"""Check that a triangle mesh is watertight and consistently wound.
+
+Every face contributes three half-edges. Sorting them by an int64 key of
+their two vertex indices and direction groups each edge with the faces that
+use it. That gives boundary edges (one face), non-manifold edges (more than
+two faces) and edges whose two faces traverse them in the same direction.
+"""
+
+import sys
+from collections import namedtuple
+
+import numpy as np
+# https://pypi.org/project/numpy-stl/
+from stl import mesh
+
+
+class ValidationReport(namedtuple('ValidationReport',
+                                  'vertices edges faces boundary_edges '
+                                  'non_manifold_edges inconsistent_edges')):
+    @property
+    def euler_characteristic(self):
+        return self.vertices - self.edges + self.faces
+
+    @property
+    def is_watertight(self):
+        """Every edge is shared by exactly two faces"""
+        return self.boundary_edges == 0 and self.non_manifold_edges == 0
+
+    @property
+    def is_oriented(self):
+        """Every edge is used once in each direction"""
+        return self.inconsistent_edges == 0
+
+    def __str__(self):
+        return ("{} vertices, {} edges, {} faces, Euler characteristic {}\n"
+                "{} boundary, {} non-manifold and {} inconsistently wound edges"
+                ).format(self.vertices, self.edges, self.faces, self.euler_characteristic,
+                         self.boundary_edges, self.non_manifold_edges, self.inconsistent_edges)
+
+
+def edge_incidence(faces):
+    """Group the half-edges of an (n, 3) face array by undirected edge.
+
+    Returns the sorted int64 key of every edge, the vertex pair of each edge,
+    the number of faces using it and how many of those traverse it from the
+    lower to the higher vertex index.
+    """
+    faces = np.asarray(faces, dtype=np.int64).reshape(-1, 3)
+    start = faces.ravel()
+    end = faces[:, [1, 2, 0]].ravel()
+    stride = int(faces.max(initial=0)) + 1
+    # The lowest bit of each half-edge key records its direction
+    keys = np.minimum(start, end) * stride + np.maximum(start, end)
+    keys <<= 1
+    keys |= start < end
+    keys.sort()
+    forward = keys & 1
+    keys >>= 1
+    firsts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else keys
+    counts = np.diff(np.r_[firsts, len(keys)])
+    forward = np.add.reduceat(forward, firsts) if len(keys) else counts
+    keys = keys[firsts]
+    return keys, np.column_stack((keys // stride, keys % stride)), counts, forward
+
+
+def validate_faces(faces):
+    """Report on the edges of an (n, 3) face array"""
+    faces = np.asarray(faces).reshape(-1, 3)
+    _, _, counts, forward = edge_incidence(faces)
+    used = np.zeros(int(faces.max(initial=-1)) + 1, dtype=bool)
+    used[faces] = True
+    pairs = counts == 2
+    return ValidationReport(
+        vertices=int(np.count_nonzero(used)),
+        edges=len(counts),
+        faces=len(faces),
+        boundary_edges=int(np.count_nonzero(counts == 1)),
+        non_manifold_edges=int(np.count_nonzero(counts > 2)),
+        inconsistent_edges=int(np.count_nonzero(forward[pairs] != 1)))
+
+
+def stl_faces(filename):
+    """Faces of an STL file over its distinct vertex positions"""
+    corners = mesh.Mesh.from_file(filename).vectors.reshape(-1, 3) + np.float32(0)
+    _, inverse = np.unique(corners, axis=0, return_inverse=True)
+    return inverse.reshape(-1, 3)
+
+
+def main():
+    if len(sys.argv) < 2:
+        print('Usage: mesh_validation.py <stl file> ...')
+        sys.exit(2)
+    failed = False
+    for filename in sys.argv[1:]:
+        report = validate_faces(stl_faces(filename))
+        print("{}: {}".format(filename, report))
+        failed = failed or not (report.is_watertight and report.is_oriented)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
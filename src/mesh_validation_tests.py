@@ -0,0 +1,41 @@
+import numpy as np
+import stl
+
+import mesh_validation
+from trimesh import TriMesh, Vertex
+
+# Closed tetrahedron with every face wound counter clockwise from outside
+TETRAHEDRON = [(0, 2, 1), (0, 1, 3), (1, 2, 3), (0, 3, 2)]
+
+def test_closed_mesh():
+    report = mesh_validation.validate_faces(TETRAHEDRON)
+    assert report == (4, 6, 4, 0, 0, 0)
+    assert report.euler_characteristic == 2
+    assert report.is_watertight and report.is_oriented
+
+def test_open_and_flipped_faces():
+    report = mesh_validation.validate_faces(TETRAHEDRON[:3])
+    assert report.boundary_edges == 3 and not report.is_watertight
+    flipped = TETRAHEDRON[:3] + [(0, 2, 3)]
+    report = mesh_validation.validate_faces(flipped)
+    assert report.is_watertight and report.inconsistent_edges == 3
+
+def test_non_manifold_edge():
+    report = mesh_validation.validate_faces(TETRAHEDRON + [(0, 1, 4)])
+    assert report.non_manifold_edges == 1 and report.boundary_edges == 2
+
+def test_edge_incidence_keys():
+    keys, pairs, counts, forward = mesh_validation.edge_incidence(TETRAHEDRON)
+    assert np.all(np.diff(keys) > 0)
+    assert pairs.tolist() == [[0, 1], [0, 2], [0, 3], [1, 2], [1, 3], [2, 3]]
+    assert counts.tolist() == [2] * 6 and forward.tolist() == [1] * 6
+
+#Generated mesh saved to "stl/tetrahedrontest.stl"
+def test_trimesh_stl_validation():
+    trimesh = TriMesh()
+    trimesh.add_vertices([Vertex(0, 0, 0), Vertex(1, 0, 0), Vertex(0, 1, 0), Vertex(0, 0, 1)])
+    trimesh.add_faces_by_index(TETRAHEDRON)
+    assert trimesh.is_manifold()
+    trimesh.trimesh_to_npmesh().save('stl/tetrahedrontest.stl', mode=stl.Mode.BINARY)
+    report = mesh_validation.validate_faces(mesh_validation.stl_faces('stl/tetrahedrontest.stl'))
+    assert report == trimesh.validate()
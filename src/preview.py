@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+
+"""Preview a record at a fraction of its resolution.
+
+Decimating divides both the rate of the groove samples and the number of
+steps in a revolution by the same factor, through the downsampling and
+rateDivisor constants, so the revolutions and their spacing stay those of
+the full build. The preview is then made by the same code as the full
+record, a small mesh in stl/ and, if asked for, a raster of the height of
+the top surface as a PGM image. The layout of the groove is printed, to
+check how many revolutions fit before committing to a full build.
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+
+import record_globals as rg
+import record_gen
+import mesh_io
+
+DECIMATION = 8
+RASTER_SIZE = 512
+
+
+def preview_config(config, factor=DECIMATION):
+    """config with the groove samples and angular steps factor times fewer"""
+    return config.replace(DOWNSAMPLING=config.DOWNSAMPLING * factor,
+                          rate_divisor=config.rate_divisor * factor)
+
+
+def groove_layout(samples, config=None):
+    """Spacing and number of the revolutions samples groove samples make"""
+    config = config or rg.default_config()
+    pitch = config.radIncr * config.revolution_steps
+    revolutions = record_gen.revolution_count(0, samples, config.revolution_steps)
+    # The inner wall of the last sample has to stay outside innerRad
+    span = (config.outer_rad - config.inner_rad - config.groove_width) / config.radIncr + 1
+    fit = max(0, int(np.ceil(span / config.revolution_steps)) - 1)
+    return {
+        'revolutions': revolutions,
+        'revolutions_that_fit': fit,
+        'pitch': pitch,
+        'land': pitch - config.groove_width,
+        'innermost_radius': config.outer_rad - config.radIncr * max(revolutions * config.revolution_steps - 1, 0),
+        'seconds_per_revolution': config.revolution_steps / config.groove_rate,
+    }
+
+
+def depth_raster(audio_array, config=None, size=RASTER_SIZE):
+    """size by size image of the height of the top surface of the record.
+
+    Each pixel takes the height of the groove sample at its angle in the
+    revolution whose groove covers its radius, the height of the record on
+    the land, and 0 off the record.
+    """
+    config = config or rg.default_config()
+    steps = config.revolution_steps
+    count = record_gen.revolution_count(0, len(audio_array), steps)
+    heights = record_gen.groove_heights(audio_array, 0, count * steps, config)
+
+    axis = (np.arange(size) + 0.5) * 2 * config.RADIUS / size - config.RADIUS
+    x, y = np.meshgrid(axis, -axis)
+    rad = np.hypot(x, y)
+    column = np.minimum((np.arctan2(y, x) % rg.tau) // config.incrNum, steps - 1).astype(np.int64)
+    # Distance inward from the outer wall of the groove at the angle of the pixel
+    offset = config.outer_rad - config.radIncr * column - rad
+    pitch = config.radIncr * steps
+    revolution = np.floor(offset / pitch).astype(np.int64)
+    in_groove = (revolution >= 0) & (revolution < count) & (offset - revolution * pitch <= config.groove_width)
+
+    raster = np.where((rad <= config.RADIUS) & (rad >= config.inner_hole / 2), float(config.record_height), 0.0)
+    sample = np.clip(revolution * steps + column, 0, max(len(heights) - 1, 0))
+    if len(heights):
+        raster[in_groove] = heights[sample[in_groove]]
+    return raster
+
+
+def write_pgm(filename, raster):
+    """Write a raster to an 8 bit binary PGM image, scaled from its lowest
+    non zero value to its highest"""
+    values = raster[raster > 0]
+    low, high = (values.min(), values.max()) if len(values) else (0, 1)
+    scale = 255 / (high - low) if high > low else 0
+    image = np.where(raster > 0, np.clip((raster - low) * scale, 0, 255), 0).astype(np.uint8)
+    with open(filename, 'wb') as fh:
+        fh.write("P5\n{} {}\n255\n".format(image.shape[1], image.shape[0]).encode('ascii'))
+        fh.write(image.tobytes())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Preview a record at a fraction of its resolution")
+    parser.add_argument("filename")
+    parser.add_argument("stlname", nargs="?")
+    parser.add_argument("-d", "--decimate", type=int, default=DECIMATION,
+                        help="keep one groove sample and angular step in this many")
+    parser.add_argument("-f", "--format", default="stl",
+                        choices=[extension[1:] for extension in mesh_io.WRITERS],
+                        help="format of the mesh written to stl/")
+    parser.add_argument("-g", "--grid", action="store_true", help="build the record as one grid")
+    parser.add_argument("-r", "--raster", metavar="FILE", help="write the depth map to FILE as a PGM image")
+    parser.add_argument("-s", "--size", type=int, default=RASTER_SIZE, help="width and height of the raster")
+    parser.add_argument("--no-mesh", action="store_true", help="only print the layout and write the raster")
+    parser.add_argument("--constants", default=rg.CONSTANTS_FILE,
+                        help="record constants file, " + rg.CONSTANTS_FILE + " unless given")
+    args = parser.parse_args()
+    if args.decimate < 1:
+        parser.error("--decimate must be at least 1")
+
+    start = time.perf_counter()
+    config = preview_config(rg.RecordConfig.load(args.constants), args.decimate)
+    samples = record_gen.normalize_audio_data(args.filename, config)
+    layout = groove_layout(len(samples), config)
+    print("{revolutions} revolutions {pitch:.3f} mm apart with {land:.3f} mm of land, "
+          "{revolutions_that_fit} fit, the innermost at {innermost_radius:.2f} mm".format(**layout))
+    if layout['revolutions'] > layout['revolutions_that_fit']:
+        print("The audio does not fit between outerRad and innerRad")
+    if args.raster:
+        write_pgm(args.raster, depth_raster(samples, config, args.size))
+        print("Depth map saved to " + args.raster)
+    if not args.no_mesh:
+        os.makedirs('stl', exist_ok=True)
+        stlname = args.stlname or os.path.splitext(os.path.basename(args.filename))[0] + "_preview"
+        try:
+            triangles = record_gen.main(args.filename, stlname, mesh_format=args.format, config=config,
+                                        grid=args.grid, samples=samples)
+        except ValueError as error:
+            parser.error(str(error))
+        print("{} triangles saved to stl/{}.{}".format(triangles, stlname, args.format))
+    print("Preview took {:.2f} s".format(time.perf_counter() - start))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+import record_globals as rg
+import record_gen
+import preview
+
+def test_preview_keeps_the_layout():
+    config = rg.default_config()
+    coarse = preview.preview_config(config, 8)
+    assert coarse.revolution_steps < config.revolution_steps / 7
+    full = preview.groove_layout(10 * config.revolution_steps, config)
+    fast = preview.groove_layout(10 * coarse.revolution_steps, coarse)
+    assert fast['revolutions'] == full['revolutions'] == 10
+    assert np.isclose(fast['pitch'], full['pitch'], rtol=1e-2)
+    assert np.isclose(fast['seconds_per_revolution'], full['seconds_per_revolution'], rtol=1e-2)
+
+def test_revolutions_that_fit_match_the_grid():
+    config = preview.preview_config(rg.default_config(), 16)
+    fit = preview.groove_layout(0, config)['revolutions_that_fit']
+    audio = np.full(fit * config.revolution_steps, 0.2)
+    record_gen.record_body(audio, config)
+    with pytest.raises(ValueError):
+        record_gen.record_body(np.full((fit + 1) * config.revolution_steps, 0.2), config)
+
+def test_depth_raster(tmp_path):
+    config = preview.preview_config(rg.default_config(), 8)
+    audio = np.full(3 * config.revolution_steps, 0.2)
+    raster = preview.depth_raster(audio, config, 400)
+    groove = record_gen.groove_heights(audio, 0, 1, config)[0]
+    assert raster.shape == (400, 400)
+    assert raster[0, 0] == 0 and raster[200, 200] == 0
+    assert set(np.unique(raster)) == {0, groove, config.record_height}
+    filename = str(tmp_path / 'depth.pgm')
+    preview.write_pgm(filename, raster)
+    with open(filename, 'rb') as fh:
+        assert fh.read(15) == b'P5\n400 400\n255\n'
+        assert len(fh.read()) == 400 * 400
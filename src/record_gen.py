@@ -1,172 +1,758 @@
 #!/usr/bin/env python
 
 from math import cos, sin
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import collections
+import contextlib
 import csv
+import hashlib
+import os
+import tempfile
+
+import numpy as np
 
 # Performance mesuring
 import time
 import memory_profiler
 
-# https://pypi.org/project/numpy-stl/
-import stl
-
 import record_globals as rg
 import trimesh as tm
+import mesh_io
+import audio_io
+import instrument
 
-from basic_shape_gen import create_polygon, calculate_record_shape
+from basic_shape_gen import create_polygon, record_blank
 
 
-def outer_upper_vertex(rad, amp, bev, theta) -> tm.Vertex:
+def outer_upper_vertex(rad, amp, bev, theta, config=None) -> tm.Vertex:
+    config = config or rg.default_config()
     width = rad + amp * bev
-    return tm.Vertex(width * cos(theta), width * sin(theta), rg.record_height)
+    return tm.Vertex(width * cos(theta), width * sin(theta), config.record_height)
 
 
-def inner_upper_vertex(rad, amp, bev, theta) -> tm.Vertex:
-    width = rad - rg.groove_width + amp * bev
-    return tm.Vertex(width * cos(theta), width * sin(theta), rg.record_height)
+def inner_upper_vertex(rad, amp, bev, theta, config=None) -> tm.Vertex:
+    config = config or rg.default_config()
+    width = rad - config.groove_width + amp * bev
+    return tm.Vertex(width * cos(theta), width * sin(theta), config.record_height)
 
 
 def outer_lower_vertex(rad, theta, g_h) -> tm.Vertex:
     return tm.Vertex(rad * cos(theta), rad * sin(theta), g_h)
 
 
-def inner_lower_vertex(rad, theta, g_h) -> tm.Vertex:
-    w = rad - rg.groove_width
+def inner_lower_vertex(rad, theta, g_h, config=None) -> tm.Vertex:
+    config = config or rg.default_config()
+    w = rad - config.groove_width
     return tm.Vertex(w * cos(theta), w * sin(theta), g_h)
 
 
-def groove_height(audio_array, sample_num):
-    """Height of the groove extracted from the audio array"""
-    baseline = rg.record_height - rg.depth
-    amp = audio_array[int(rg.rate_divisor * sample_num)]
+def groove_height(audio_array, sample_num, config=None):
+    """Height of the groove extracted from the groove rate audio array"""
+    config = config or rg.default_config()
+    baseline = config.record_height - config.depth
+    amp = audio_array[sample_num]
     return rg.truncate( baseline + amp, rg.precision)
 
-def starting_cap(gH, shape):
-    s1 = [outer_upper_vertex(rg.RADIUS, rg.amplitude, rg.bevel, 0),
-          inner_upper_vertex(rg.RADIUS, rg.amplitude, rg.bevel, 0)]
-    s2 = [outer_lower_vertex(rg.RADIUS, 0, gH), inner_lower_vertex(rg.RADIUS, 0, gH)]
+def starting_cap(gH, shape, config=None):
+    config = config or rg.default_config()
+    s1 = [outer_upper_vertex(config.RADIUS, config.amplitude, config.bevel, 0, config),
+          inner_upper_vertex(config.RADIUS, config.amplitude, config.bevel, 0, config)]
+    s2 = [outer_lower_vertex(config.RADIUS, 0, gH),
+          inner_lower_vertex(config.RADIUS, 0, gH, config)]
     shape.quadstrip(s1, s2)
     return shape
 
-def draw_groove_cap(last_edge, rad, height, shape):
+def draw_groove_cap(last_edge, rad, height, shape, config=None):
     """Draws the ramp between the groove and inner cap"""
-    stop1 = [outer_upper_vertex(rad, rg.amplitude, rg.bevel, 0),
-             inner_upper_vertex(rad, rg.amplitude, rg.bevel, 0)]
-    stop2 = [outer_lower_vertex(rad, 0, height), inner_lower_vertex(rad, 0, height)]
+    config = config or rg.default_config()
+    stop1 = [outer_upper_vertex(rad, config.amplitude, config.bevel, 0, config),
+             inner_upper_vertex(rad, config.amplitude, config.bevel, 0, config)]
+    stop2 = [outer_lower_vertex(rad, 0, height), inner_lower_vertex(rad, 0, height, config)]
     shape.quadstrip(stop1, stop2)
 
     # Fill in around cap
-    stop3 = [last_edge[-1], tm.Vertex(rg.inner_rad, rad, rg.record_height)]
+    stop3 = [last_edge[-1], tm.Vertex(config.inner_rad, rad, config.record_height)]
     shape.add_vertex(stop3[1])
     shape.quadstrip(stop1, stop3)
 
     return shape
 
 
-def fill_remaining_area(r, shape, edge_num=32):
+def fill_remaining_area(r, shape, edge_num=32, config=None):
     """Fill the space between the last groove and the center hole"""
-    remaining_space = create_polygon(rg.inner_rad, edge_num, rg.record_height)
-    edge_of_groove = create_polygon(r, edge_num, rg.record_height)
+    config = config or rg.default_config()
+    remaining_space = create_polygon(config.inner_rad, edge_num, config.record_height)
+    edge_of_groove = create_polygon(r, edge_num, config.record_height)
     remaining_space.append(remaining_space[0])
     edge_of_groove.append(edge_of_groove[0])
     shape.quadstrip(remaining_space, edge_of_groove)
     return shape
 
 
-def draw_spiral(samplenum, audio_array, index, rad, gH, shape, info):
-    arr_length = len(audio_array)
-    while rg.rate_divisor * samplenum < (arr_length - rg.rate_divisor * rg.thetaIter + 1):
-        groove_outer_upper = []
-        groove_outer_lower = []
-        groove_inner_upper = []
-        groove_inner_lower = []
-
-        theta = 0
-        while theta < rg.tau:
-            gH = groove_height(audio_array, samplenum)
-            if index == 0:
-                groove_outer_upper.append(outer_upper_vertex(rad, rg.amplitude, rg.bevel, theta))
-            groove_outer_lower.append(inner_upper_vertex(rad, rg.amplitude, rg.bevel, theta))
-            groove_inner_upper.append(outer_lower_vertex(rad, theta, gH))
-            groove_inner_lower.append(inner_lower_vertex(rad, theta, gH))
-            rad -= rg.radIncr
-            theta += rg.incrNum
-            samplenum += 1
-
-        gH = groove_height(audio_array, samplenum)
-        if index == 0:
-            # Draw triangle to close outer part of record
-            shape.quadstrip(groove_outer_upper, groove_outer_lower)
-        else:
-            shape.quadstrip(groove_inner_upper, groove_outer_lower)
-
-        shape.quadstrip(groove_outer_lower, groove_inner_lower)
-        shape.quadstrip(groove_inner_lower, groove_inner_upper)
-        last_edge = groove_inner_upper
-
-        index += 1
-        if info:
-            print("Groove drawn: {}".format(index))
-    return samplenum, last_edge, rad
+def revolution_angles(config=None):
+    """Angle of every sample in one revolution of the spiral"""
+    config = config or rg.default_config()
+    return config.revolution_table[:, 0]
+
+
+def groove_heights(audio_array, samplenum, count, config=None):
+    """Heights of count consecutive groove samples starting at samplenum"""
+    config = config or rg.default_config()
+    baseline = config.record_height - config.depth
+    amp = np.asarray(audio_array[samplenum:samplenum + count], dtype=np.float64)
+    return rg.truncate_array(baseline + amp, rg.precision)
+
+
+def adaptive_max_span(rad, tolerance, config=None):
+    """Most samples a chord of the circle of radius rad may span while
+    staying within tolerance of the arc"""
+    config = config or rg.default_config()
+    if tolerance >= rad:
+        return None
+    return max(1, int(2 * np.arccos(1 - tolerance / rad) / config.incrNum))
+
+
+def adaptive_samples(heights, tolerance, max_span=None):
+    """Indices of the groove samples needed to follow heights within tolerance.
+
+    A sample is dropped when the line between the samples kept on either side
+    of it passes within tolerance of every original height in between, and
+    the two are at most max_span samples apart. The first and last samples
+    are always kept. Every pass tests all kept samples at once and drops
+    every other one of each run of droppable samples, so no two neighbours
+    go in the same pass, until nothing more can be dropped.
+    """
+    count = len(heights)
+    kept = np.arange(count)
+    if tolerance <= 0 or count < 3:
+        return kept
+    index = np.arange(count)
+
+    def deviation(owner):
+        # Distance of every sample from the chord over candidate owner
+        start = kept[np.clip(owner - 1, 0, len(kept) - 1)]
+        stop = kept[np.clip(owner + 1, 0, len(kept) - 1)]
+        span = np.maximum(stop - start, 1)
+        line = heights[start] + (heights[stop] - heights[start]) * (index - start) / span
+        return np.abs(heights - line)
+
+    while len(kept) > 2:
+        # Samples from kept[c] up to kept[c + 1], then after kept[c - 1] up to kept[c]
+        right = np.maximum.reduceat(deviation(np.searchsorted(kept, index, 'right') - 1), kept[:-1])
+        left = np.maximum.reduceat(deviation(np.searchsorted(kept, index, 'left')), kept[:-1] + 1)
+        error = np.maximum(right[1:], left[:-1])
+        removable = error <= tolerance
+        if max_span is not None:
+            removable &= kept[2:] - kept[:-2] <= max_span
+        if not removable.any():
+            break
+        position = np.arange(len(removable))
+        run_start = np.maximum.accumulate(np.where(removable, 0, position + 1))
+        drop = removable & ((position - run_start) % 2 == 0)
+        kept = np.delete(kept, np.flatnonzero(drop) + 1)
+    return kept
+
+
+def groove_rails(rad, angles, g_h, config=None):
+    """Rows of the four groove rails for arrays of radius and height and
+    rows of an angle table, see rg.angle_table.
+
+    Returns the outer upper, inner upper, outer lower and inner lower rails
+    matching the single vertex helpers above.
+    """
+    config = config or rg.default_config()
+    cos_t, sin_t = angles[:, 1], angles[:, 2]
+
+    def rail(width, height):
+        return np.column_stack((width * cos_t, width * sin_t,
+                                np.broadcast_to(height, width.shape)))
+
+    bevel_width = config.amplitude * config.bevel
+    return (rail(rad + bevel_width, config.record_height),
+            rail(rad - config.groove_width + bevel_width, config.record_height),
+            rail(rad, g_h),
+            rail(rad - config.groove_width, g_h))
+
+
+def draw_revolution(audio_array, samplenum, rad, angles, first=False, tolerance=0, config=None):
+    """Mesh of one revolution of the groove and the rail it ends on.
+
+    angles holds a row of the angle table for each sample of the revolution.
+    With a tolerance, only the samples adaptive_samples keeps are drawn.
+    """
+    config = config or rg.default_config()
+    steps = len(angles)
+    radii = rad - config.radIncr * np.arange(steps)
+    heights = groove_heights(audio_array, samplenum, steps, config)
+    if tolerance > 0:
+        keep = adaptive_samples(heights, tolerance, adaptive_max_span(rad, tolerance, config))
+        radii, angles, heights = radii[keep], angles[keep], heights[keep]
+    rails = groove_rails(radii, angles, heights, config)
+
+    drawn = rails[1:] + rails[:1] if first else rails[1:]
+    # No two rails share a point, so the mesh is welded as it is built and
+    # never has to be searched for duplicates
+    revolution = tm.TriMesh.from_arrays(np.concatenate(drawn), np.zeros((0, 3), dtype=np.int32),
+                                        welded=True)
+    groove_outer_lower, groove_inner_upper, groove_inner_lower, outer_upper = (
+        np.arange(i * len(radii), (i + 1) * len(radii)) for i in range(4))
+    if first:
+        # Draw triangle to close outer part of record
+        revolution.quadstrip_by_index(outer_upper, groove_outer_lower)
+    else:
+        revolution.quadstrip_by_index(groove_inner_upper, groove_outer_lower)
+
+    revolution.quadstrip_by_index(groove_outer_lower, groove_inner_lower)
+    revolution.quadstrip_by_index(groove_inner_lower, groove_inner_upper)
+    return revolution, rails[2]
+
+
+# Bump when draw_revolution changes to invalidate cached revolutions
+REVOLUTION_VERSION = 1
+REVOLUTION_CACHE_DIR = os.path.join('cache', 'revolutions')
+
+
+def revolution_key(samples, rad, first=False, tolerance=0, config=None):
+    """Hash of the samples of a revolution and every parameter its mesh depends on"""
+    config = config or rg.default_config()
+    params = (REVOLUTION_VERSION, config.amplitude, config.bevel, config.groove_width,
+              config.record_height, config.depth, rg.precision, config.radIncr, config.incrNum,
+              float(rad), bool(first), float(tolerance))
+    digest = hashlib.sha256(repr(params).encode('ascii'))
+    digest.update(np.ascontiguousarray(samples, dtype=np.float64).tobytes())
+    return digest.hexdigest()[:32]
+
+
+def cached_revolution(audio_array, samplenum, rad, angles, first=False, tolerance=0,
+                      cache_dir=None, config=None):
+    """draw_revolution, reusing the revolution saved in cache_dir when it was
+    drawn before from the same samples and parameters.
+
+    Returns the mesh, the rail it ends on and whether it came from the cache.
+    Without a cache_dir every revolution is drawn.
+    """
+    if cache_dir is None:
+        return draw_revolution(audio_array, samplenum, rad, angles, first, tolerance,
+                               config) + (False,)
+    samples = audio_array[samplenum:samplenum + len(angles)]
+    key = revolution_key(samples, rad, first, tolerance, config)
+    path = os.path.join(cache_dir, key + '.npz')
+    if os.path.isfile(path):
+        with np.load(path) as arrays:
+            return (tm.TriMesh.from_arrays(arrays['vertices'], arrays['faces'], welded=True),
+                    arrays['edge'], True)
+
+    revolution, edge = draw_revolution(audio_array, samplenum, rad, angles, first, tolerance, config)
+    mesh_io.save_npz_atomic(path, vertices=revolution.vertices, faces=revolution.faces, edge=edge)
+    return revolution, edge, False
+
+
+def revolution_count(samplenum, arr_length, steps):
+    """Number of revolutions draw_spiral draws from samplenum"""
+    # Only start a revolution when every one of its samples is available
+    return max(0, (arr_length - samplenum) // steps)
+
+
+def revolution_radius(rad, r, config=None):
+    """Radius revolution r of a spiral starting at rad starts at.
+
+    Every path drawing a revolution takes its radius from here, so the
+    radius, and with it the key of the revolution in the cache, is the same
+    to the last bit however the spiral is split up.
+    """
+    config = config or rg.default_config()
+    return rad - config.radIncr * config.revolution_steps * r
+
+
+def draw_revolutions(audio_array, samplenum, rad, index, start, count, tolerance=0,
+                     cache_dir=None, config=None):
+    """Mesh of revolutions start to start + count of a spiral starting at rad
+    whose first revolution is number index, and the rail the last one ends on.
+
+    Revolution start begins at sample samplenum of audio_array, each one
+    after at the next steps samples, so any range of revolutions can be drawn
+    from the samples of that range alone.
+    """
+    config = config or rg.default_config()
+    angles = config.revolution_table
+    steps = len(angles)
+    vertices, faces, offset, edge = [], [], 0, None
+    for r in range(start, start + count):
+        revolution, edge, _ = cached_revolution(audio_array, samplenum + (r - start) * steps,
+                                             revolution_radius(rad, r, config), angles,
+                                             index + r == 0, tolerance, cache_dir, config)
+        vertices.append(revolution.vertices)
+        faces.append(revolution.faces + offset)
+        offset += len(revolution.vertices)
+    if not vertices:
+        return tm.TriMesh(), edge
+    # Revolutions lie at their own radii and share no vertex either
+    return tm.TriMesh.from_arrays(np.concatenate(vertices), np.concatenate(faces), welded=True), edge
+
+
+def _revolution_range(args):
+    """Worker entry point, returns a range of revolutions and the rail it ends on.
+
+    With records set the range comes back as finished STL records, so the
+    parent only has to write them, otherwise as welded vertex and face arrays.
+    """
+    records, draw_args = args
+    shape, edge = draw_revolutions(*draw_args)
+    if records:
+        return mesh_io.stl_records(shape.vertices[shape.faces]), edge
+    return (shape.vertices, shape.faces), edge
+
+
+# Longest range of revolutions handed to one worker, which bounds the
+# samples a job carries however long the track is
+RANGE_REVOLUTIONS = 32
+
+
+def revolution_ranges(count, workers):
+    """Split count revolutions into contiguous (start, count) ranges"""
+    size = min(RANGE_REVOLUTIONS, max(1, -(-count // (4 * workers))))
+    return [(start, min(size, count - start)) for start in range(0, count, size)]
+
+
+def ordered_results(executor, function, jobs, limit):
+    """Results of function over jobs in order, like executor.map.
+
+    Only limit jobs are submitted ahead of the result being read, so a lazy
+    jobs iterable is only taken as far as the pool gets.
+    """
+    pending = collections.deque()
+    for job in jobs:
+        pending.append(executor.submit(function, job))
+        if len(pending) >= limit:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def draw_spiral(samplenum, audio_array, index, rad, gH, shape, info, workers=1, tolerance=0,
+                cache_dir=None, config=None, tracer=None):
+    """Draw the spiral one revolution at a time.
+
+    Each revolution is built in its own mesh and merged into shape, which may
+    also be a mesh_io writer streaming the triangles to disk. With more than
+    one worker, ranges of revolutions are drawn in a process pool and merged
+    in order. A tolerance in mm drops groove samples that linear
+    interpolation reproduces that closely, see adaptive_samples. With a
+    cache_dir, revolutions whose samples did not change since an earlier run
+    are read back instead of drawn, see cached_revolution.
+
+    Each finished revolution is reported to tracer as progress, which
+    prints it when info is set and no tracer is given.
+    """
+    config = config or rg.default_config()
+    if tracer is None:
+        tracer = instrument.Tracer([instrument.print_progress] if info else [])
+    angles = config.revolution_table
+    steps = len(angles)
+    count = revolution_count(samplenum, len(audio_array), steps)
+    last_edge = None
 
-def draw_grooves(audio_array, rad, shape=tm.TriMesh(), info=True):
-    """rad is the radial postion of the vertex beign drawn"""
+    if workers > 1 and count > 1:
+        ranges = revolution_ranges(count, workers)
+        # Workers turn their ranges into STL records themselves when that is
+        # what shape writes
+        records = isinstance(shape, mesh_io.StlWriter)
+        # Each worker only receives the samples of its own range, sliced as
+        # the job is submitted
+        jobs = ((records, (audio_array[samplenum + start * steps:samplenum + (start + length) * steps],
+                           0, rad, index, start, length, tolerance, cache_dir, config))
+                for start, length in ranges)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = ordered_results(executor, _revolution_range, jobs, 2 * workers)
+            # The spiral ends on the rail of the last range
+            for (start, length), (part, last_edge) in zip(ranges, results):
+                if records:
+                    shape.write_records(part)
+                else:
+                    shape.merge(tm.TriMesh.from_arrays(*part, welded=True))
+                tracer.progress("Groove drawn", index + start + length, index + count)
+    else:
+        for r in range(count):
+            revolution, last_edge, reused = cached_revolution(
+                audio_array, samplenum + r * steps, revolution_radius(rad, r, config), angles,
+                index + r == 0, tolerance, cache_dir, config)
+            shape.merge(revolution)
+            tracer.progress("Groove reused" if reused else "Groove drawn", index + r + 1, index + count)
+
+    return samplenum + count * steps, last_edge, revolution_radius(rad, count, config)
+
+def draw_grooves(audio_array, rad, shape=None, info=False, sink=None, workers=1, tolerance=0,
+                 cache_dir=None, config=None, tracer=None):
+    """rad is the radial postion of the vertex beign drawn
+
+    Revolutions of the spiral are merged into sink, which defaults to shape.
+    The caps at either end of the groove are always drawn into shape. The
+    record is drawn to config, the default config unless given. Progress
+    goes to tracer, see draw_spiral.
+    """
+    if shape is None:
+        shape = tm.TriMesh()
+    if sink is None:
+        sink = shape
 
     # Inner while for groove position
     last_edge = None
     index = 0
     samplenum = 0
-    gH = groove_height(audio_array, samplenum)
+    gH = groove_height(audio_array, samplenum, config)
 
-    starting_cap(gH, shape)
+    starting_cap(gH, shape, config)
 
-    samplenum, last_edge, rad = draw_spiral(samplenum, audio_array, index, rad, gH, shape, info)
+    samplenum, last_edge, rad = draw_spiral(samplenum, audio_array, index, rad, gH, sink, info,
+                                            workers, tolerance, cache_dir, config, tracer)
 
     # Draw groove cap
-    gH = groove_height(audio_array, samplenum)
-    shape = draw_groove_cap(last_edge, rad, gH, shape)
+    gH = groove_height(audio_array, min(samplenum, len(audio_array) - 1), config)
+    shape = draw_groove_cap(last_edge, rad, gH, shape, config)
 
     # Close remaining space between last groove and center hole
-    return fill_remaining_area(rad, shape)
-
-def normalize_audio_data(filename):
-    # Read in array of bytes as float
-    audio_file = open(filename, 'rt', newline='')
-    lst = [x for x in csv.reader(audio_file, delimiter=',')][0]
-    lst = [float(x) for x in lst if x != '']
-
-    # Normalize the values
-    current_max = max(lst)
-    lst = [rg.truncate(abs(x) + current_max, rg.precision) for x in lst]
-    current_max *= 8
-    normalized_depth = [rg.truncate(x / current_max, rg.precision) for x in lst]
-    return normalized_depth
-
-def main(filename, stlname):
-
-    # Read in array of bytes as float
-    normalized_depth = normalize_audio_data(filename)
-
-    print("Generate record shape")
-    record_mesh = calculate_record_shape(info=False)
-    print("Drawing spiral object")
-    trimesh = draw_grooves(normalized_depth, rg.outer_rad, record_mesh)
-    print("Removing duplicate faces from shape spiral object")
-    trimesh.remove_duplicate_faces()
-    print("Removing empty faces from shape spiral object")
-    trimesh.remove_empty_faces()
-    trimesh.is_manifold()
-    print("Converting shape to mesh object")
-    full_mesh = trimesh.trimesh_to_npmesh()
-    print("Saving mesh to " + "stl/" + stlname + ".stl")
-    full_mesh.save("stl/" + stlname + ".stl", mode=stl.Mode.BINARY)
+    return fill_remaining_area(rad, shape, config=config)
+
+def grid_strip(outer, inner):
+    """Faces of the quads between two rows of vertex indices running
+    anticlockwise, two triangles for outer[i], outer[i + 1], inner[i + 1],
+    inner[i]. Strips between consecutive rows of a cross section are wound
+    consistently with each other."""
+    a, b, c, d = outer[:-1], outer[1:], inner[1:], inner[:-1]
+    return np.concatenate((np.column_stack((a, b, c)), np.column_stack((a, c, d))))
+
+
+def grid_wedge(vertices, left, right):
+    """Faces filling the flat gap at the start of a revolution between the
+    chain of vertex indices left, on the last angle of the revolution, and
+    right, on the first. Both chains run from the outside in. The faces
+    zip the chains together by radius and face upward."""
+    radius = np.hypot(vertices[:, 0], vertices[:, 1])
+    faces = []
+    i = j = 0
+    while i < len(left) - 1 or j < len(right) - 1:
+        if j == len(right) - 1 or (i < len(left) - 1 and radius[left[i + 1]] >= radius[right[j + 1]]):
+            faces.append((left[i], left[i + 1], right[j]))
+            i += 1
+        else:
+            faces.append((left[i], right[j + 1], right[j]))
+            j += 1
+    faces = np.array(faces, dtype=np.int64)
+    corners = vertices[faces]
+    down = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])[:, 2] < 0
+    faces[down] = faces[down][:, ::-1]
+    return faces
+
+
+def record_body(audio_array, config=None) -> tm.TriMesh:
+    """The whole record, blank and groove, as one structured annular grid.
+
+    Every vertex lies on one of the angles of config.revolution_table and is
+    made once. The groove is four rows following the spiral, outer upper,
+    outer lower, inner lower and inner upper, for every sample of the whole
+    revolutions in audio_array. The land between revolutions joins the
+    inner upper row to the outer upper row one revolution on. The rings of
+    the outer edge and the center hole close the top surface, the outer
+    wall, the bottom and the wall of the hole around it. Faces are built as
+    index arrays, so the mesh is watertight and consistently wound without
+    welding or removing duplicate faces.
+    """
+    config = config or rg.default_config()
+    table = config.revolution_table
+    steps = len(table)
+    count = revolution_count(0, len(audio_array), steps)
+    samples = count * steps
+    radii = config.outer_rad - config.radIncr * np.arange(samples)
+    if count and radii[-1] - config.groove_width <= config.inner_rad:
+        raise ValueError("{} revolutions of audio do not fit between outerRad and innerRad"
+                         .format(count))
+
+    def ring(rad, height):
+        return np.column_stack((rad * table[:, 1], rad * table[:, 2], np.full(steps, height, dtype=float)))
+
+    hole = config.inner_hole / 2
+    rings = [ring(config.RADIUS, config.record_height), ring(config.RADIUS, 0),
+             ring(hole, 0), ring(hole, config.record_height)]
+    rails = groove_rails(radii, np.tile(table, (count, 1)),
+                         groove_heights(audio_array, 0, samples, config), config)
+    # Rows of the groove in the order of its cross section
+    rows = [rails[0], rails[2], rails[3], rails[1]]
+    vertices = np.concatenate(rings + rows)
+
+    edge_top, edge_bottom, hole_bottom, hole_top = (np.arange(steps) + k * steps for k in range(4))
+    outer_upper, outer_lower, inner_lower, inner_upper = (
+        np.arange(samples) + 4 * steps + k * samples for k in range(4))
+
+    def wrap(row):
+        return np.append(row, row[0])
+
+    # Around the cross section of the body from the hole to the outer edge
+    faces = [grid_strip(wrap(hole_top), wrap(hole_bottom)),
+             grid_strip(wrap(hole_bottom), wrap(edge_bottom)),
+             grid_strip(wrap(edge_bottom), wrap(edge_top))]
+    last = steps - 1
+    if count == 0:
+        faces.append(grid_strip(wrap(edge_top), wrap(hole_top)))
+    else:
+        groove = [outer_upper, outer_lower, inner_lower, inner_upper]
+        faces += [grid_strip(outer, inner) for outer, inner in zip(groove, groove[1:])]
+        faces += [grid_strip(inner_upper[:-steps], outer_upper[steps:]),
+                  grid_strip(edge_top, outer_upper[:steps]),
+                  grid_strip(inner_upper[-steps:], hole_top),
+                  # Ends of the groove
+                  grid_strip(np.array([outer_upper[0], outer_lower[0]]),
+                             np.array([inner_upper[0], inner_lower[0]])),
+                  grid_strip(np.array([inner_upper[-1], inner_lower[-1]]),
+                             np.array([outer_upper[-1], outer_lower[-1]]))]
+        end = [outer_upper[-1], inner_upper[-1], hole_top[last]]
+        if count == 1:
+            faces.append(grid_wedge(vertices, [edge_top[last]] + end,
+                                    [edge_top[0], outer_upper[0], inner_upper[0], hole_top[0]]))
+        else:
+            faces.append(grid_wedge(vertices, [edge_top[last], outer_upper[last]],
+                                    [edge_top[0], outer_upper[0], inner_upper[0], outer_upper[steps]]))
+            faces.append(grid_wedge(vertices, [inner_upper[-steps - 1]] + end,
+                                    [inner_upper[-steps], hole_top[0]]))
+    return tm.TriMesh.from_arrays(vertices, np.concatenate(faces), welded=True)
+
+
+def read_audio_data(filename, config=None):
+    """Mono samples and their rate from a sample file, or from a legacy CSV
+    file recorded at the configured sampling rate"""
+    config = config or rg.default_config()
+    if filename.endswith(audio_io.SAMPLE_EXTENSION):
+        samples, rate = audio_io.read_samples(filename)
+        return (samples[:, 0] if samples.shape[1] == 1 else samples.mean(axis=1)), rate
+    with open(filename, 'rt', newline='') as audio_file:
+        lst = [x for x in csv.reader(audio_file, delimiter=',')][0]
+    return np.array([float(x) for x in lst if x != '']), config.samplingRate
+
+def sample_windows(samples, chunk_frames=None):
+    """Consecutive float64 windows of an array or audio_io.SampleWindows"""
+    chunk_frames = chunk_frames or audio_io.CHUNK_FRAMES
+    for start in range(0, len(samples), chunk_frames):
+        yield np.asarray(samples[start:start + chunk_frames], dtype=np.float64)
+
+def audio_level(samples, strategy='peak', percentile=99.9, chunk_frames=None):
+    """Level of the samples that normalize_samples scales to, one of rg.NORMALIZATIONS.
+
+    peak is the largest magnitude, from one min/max pass. rms is the peak
+    of a sine of the same RMS and percentile that percentile of the
+    magnitudes, found from a histogram of 2**16 bins up to the peak.
+    Samples above the level are clipped. Silence has a level of 1.
+    """
+    peak, squares = 0.0, 0.0
+    for window in sample_windows(samples, chunk_frames):
+        if len(window):
+            peak = max(peak, window.max(), -window.min())
+            squares += np.dot(window, window)
+    if peak == 0:
+        return 1.0
+    if strategy == 'peak':
+        return float(peak)
+    if strategy == 'rms':
+        return float(min(peak, np.sqrt(2 * squares / len(samples))))
+    if strategy == 'percentile':
+        counts = np.zeros(1 << 16, dtype=np.int64)
+        for window in sample_windows(samples, chunk_frames):
+            counts += np.histogram(np.abs(window), len(counts), (0, peak))[0]
+        index = np.searchsorted(np.cumsum(counts), percentile / 100 * len(samples))
+        return float(peak * min(index + 1, len(counts)) / len(counts))
+    raise ValueError("Unknown normalization {}".format(strategy))
+
+def layer_step(config):
+    """Step in mm the groove is rounded to, one layer if config.quantize"""
+    return config.microns_per_layer / 1000 if config.quantize else None
+
+def normalize_samples(samples, level, step=None):
+    """float32 groove depths in [1/8, 1/4] of samples scaled to level,
+    rounded to multiples of step if given"""
+    samples = np.abs(np.asarray(samples, dtype=np.float64))
+    samples = rg.truncate_array(np.minimum(samples, level) + level, rg.precision)
+    samples = rg.truncate_array(samples / (8 * level), rg.precision)
+    if step:
+        samples = np.round(samples / step) * step
+    return samples.astype(np.float32)
+
+def normalize_groove(samples, config=None):
+    """Groove depths of samples normalized as config asks"""
+    config = config or rg.default_config()
+    level = audio_level(samples, config.normalization, config.clip_percentile)
+    return normalize_samples(samples, level, layer_step(config))
+
+class NormalizedSamples():
+    """Groove samples normalized one window at a time as they are indexed.
+
+    Wraps an array such as a mapped sample file, so drawing the spiral only
+    holds the samples of the revolution being drawn in memory.
+    """
+    def __init__(self, samples, level, step=None):
+        self.samples = samples
+        self.level = level
+        self.step = step
+
+    def __len__(self):
+        return len(self.samples)
+
+    def __getitem__(self, index):
+        return normalize_samples(self.samples[index], self.level, self.step)
+
+def map_audio_data(filename, scratch_dir, config=None):
+    """Normalized groove samples like normalize_audio_data, backed by a file.
+
+    The audio is decoded, downmixed and resampled a block at a time into a
+    sample file in scratch_dir, whose level is then measured. The spiral
+    maps that file one window at a time, so memory use does not grow with
+    the length of the track.
+    """
+    config = config or rg.default_config()
+    extension = os.path.splitext(filename)[1].lower()
+    if extension in audio_io.WAVE_EXTENSIONS + audio_io.AIFF_EXTENSIONS:
+        rate, _, blocks = audio_io.lpcm_blocks(filename)
+    elif extension == audio_io.SAMPLE_EXTENSION:
+        samples = audio_io.SampleWindows(filename)
+        rate, blocks = samples.sample_rate, samples.blocks()
+    else:
+        samples, rate = read_audio_data(filename, config)
+        blocks = [samples]
+    path = os.path.join(scratch_dir, 'groove' + audio_io.SAMPLE_EXTENSION)
+    audio_io.write_sample_blocks(
+        path, audio_io.resample_blocks(blocks, rate, config.groove_rate), config.groove_rate)
+    samples = audio_io.SampleWindows(path)
+    level = audio_level(samples, config.normalization, config.clip_percentile)
+    return NormalizedSamples(samples, level, layer_step(config))
+
+def normalize_audio_data(filename, config=None):
+    """Normalized groove samples, one for each vertex ring of the spiral.
+
+    The audio is low pass filtered and resampled to the groove rate once, up
+    front. Wave and aiff files are decoded and resampled in chunks as they
+    are read, other files are read whole as sample or CSV files.
+    """
+    config = config or rg.default_config()
+    extension = os.path.splitext(filename)[1].lower()
+    if extension in audio_io.WAVE_EXTENSIONS + audio_io.AIFF_EXTENSIONS:
+        samples = audio_io.read_lpcm(filename, config.groove_rate)
+    else:
+        # Read in array of bytes as float
+        samples, rate = read_audio_data(filename, config)
+        samples = audio_io.resample(samples, rate, config.groove_rate)
+    return normalize_groove(samples, config)
+
+def main(filename, stlname, workers=1, info=False, tolerance=None, mesh_format='stl',
+         cache_dir=None, config=None, mapped=False, tracer=None, grid=False, samples=None):
+    """Engrave filename on a record saved as stl/<stlname>.<mesh_format>,
+    where mesh_format is one of those in mesh_io.WRITERS. Revolutions are
+    cached in cache_dir, if given, and reused by later runs. mapped keeps
+    the audio in a temporary file rather than in memory, see map_audio_data.
+    samples are the groove samples of filename normalized to config, read
+    from filename unless given.
+
+    config is the rg.RecordConfig of the record, read from
+    record_constants.ini unless given. tolerance is that of the adaptive
+    groove in mm, config.adaptive_tolerance unless given. Each stage is a
+    span of tracer, an instrument.Tracer that prints them and the progress
+    of the spiral when info is set and none is given. grid builds the record
+    as one grid, see record_body, instead of drawing the spiral revolution
+    by revolution over the blank, which workers, tolerance and cache_dir
+    apply to. Returns the number of triangles written.
+    """
+    config = config or rg.default_config()
+    if tolerance is None:
+        tolerance = config.adaptive_tolerance
+    if tracer is None:
+        tracer = instrument.Tracer([instrument.print_progress] if info else [])
+
+    with contextlib.ExitStack() as stack:
+        with tracer.span('read', unit='samples') as span:
+            if samples is not None:
+                normalized_depth = samples
+            elif mapped:
+                scratch_dir = stack.enter_context(tempfile.TemporaryDirectory(prefix='record_gen'))
+                normalized_depth = map_audio_data(filename, scratch_dir, config)
+            else:
+                # Read in array of bytes as float
+                normalized_depth = normalize_audio_data(filename, config)
+            span.items = len(normalized_depth)
+        stl_path = "stl/" + stlname + "." + mesh_format
+
+        if grid:
+            # Build the body first, so audio that does not fit leaves no file
+            with tracer.span('body', unit='triangles') as span:
+                body = record_body(normalized_depth, config)
+                span.items = len(body)
+            stl_file = stack.enter_context(mesh_io.open_writer(stl_path, stlname))
+            print("Saving record body to " + stl_path)
+            with tracer.span('save', unit='triangles') as span:
+                stl_file.merge(body)
+                stl_file.close()
+                span.items = len(stl_file)
+            return len(stl_file)
+
+        print("Generate record shape")
+        with tracer.span('blank', unit='triangles') as span:
+            record_mesh = record_blank(config=config)
+            span.items = len(record_mesh)
+        stl_file = stack.enter_context(mesh_io.open_writer(stl_path, stlname))
+        print("Drawing spiral object and streaming it to " + stl_path)
+        with tracer.span('spiral', unit='triangles') as span:
+            trimesh = draw_grooves(normalized_depth, config.outer_rad, record_mesh,
+                                   sink=stl_file, workers=workers, tolerance=tolerance,
+                                   cache_dir=cache_dir, config=config, tracer=tracer)
+            span.items = len(stl_file)
+        with tracer.span('cleanup', unit='triangles') as span:
+            span.items = len(trimesh)
+            print("Vertices welded: {}".format(trimesh.weld(config.weld_tolerance)))
+            print("Removing duplicate faces from shape spiral object")
+            print("Duplicate faces removed: {}".format(trimesh.remove_duplicate_faces()))
+            print("Removing empty faces from shape spiral object")
+            print("Empty faces removed: {}".format(trimesh.remove_empty_faces()))
+        print("Saving record body to " + stl_path)
+        with tracer.span('save', unit='triangles') as span:
+            stl_file.merge(trimesh)
+            stl_file.close()
+            span.items = len(stl_file)
+        return len(stl_file)
 
 
 # Run program
 if __name__ == '__main__':
     m1 = memory_profiler.memory_usage()
     t1 = time.process_time()
-    main("audio/sample.csv", "sample_engraved")
+    parser = argparse.ArgumentParser(description="Engrave an audio file on a record")
+    parser.add_argument("filename", nargs="?", default="audio/sample" + audio_io.SAMPLE_EXTENSION)
+    parser.add_argument("stlname", nargs="?")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="number of processes drawing the spiral")
+    parser.add_argument("-f", "--format", default="stl",
+                        choices=[extension[1:] for extension in mesh_io.WRITERS],
+                        help="format of the mesh written to stl/")
+    parser.add_argument("-c", "--cache", nargs="?", const=REVOLUTION_CACHE_DIR, metavar="DIR",
+                        help="reuse the revolutions of earlier runs whose audio did not change, "
+                             "kept in " + REVOLUTION_CACHE_DIR + " unless given")
+    parser.add_argument("-a", "--adaptive", type=float, metavar="MICRONS",
+                        help="drop groove samples within this distance of the line "
+                             "through their neighbours")
+    parser.add_argument("-m", "--mmap", action="store_true",
+                        help="keep the audio in a temporary file instead of memory, for long tracks")
+    parser.add_argument("--constants", default=rg.CONSTANTS_FILE,
+                        help="record constants file, " + rg.CONSTANTS_FILE + " unless given")
+    parser.add_argument("-g", "--grid", action="store_true",
+                        help="build the record as one watertight grid instead of revolution by revolution")
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="print every revolution and the time of every stage")
+    parser.add_argument("--trace", metavar="FILE",
+                        help="write the time of every stage to FILE as a Chrome JSON trace")
+    args = parser.parse_args()
+    tracer = instrument.Tracer([instrument.print_progress] if args.verbose else [])
+    stlname = args.stlname or os.path.splitext(os.path.basename(args.filename))[0] + "_engraved"
+    tolerance = None if args.adaptive is None else args.adaptive / 1000
+    main(args.filename, stlname, args.jobs, tolerance=tolerance, mesh_format=args.format,
+         cache_dir=args.cache, config=rg.RecordConfig.load(args.constants), mapped=args.mmap,
+         tracer=tracer, grid=args.grid)
+    if args.trace:
+        tracer.write(args.trace)
     t2 = time.process_time()
     m2 = memory_profiler.memory_usage()
     time_diff = t2 - t1
@@ -0,0 +1,215 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+import instrument
+import record_globals as rg
+import record_gen
+from trimesh import TriMesh
+
+def sine_audio(length):
+    return 0.1 * np.sin(np.arange(length) * 0.01)
+
+def test_draw_spiral_matches_vertex_helpers():
+    steps = len(record_gen.revolution_angles())
+    audio = sine_audio(steps * 2 + 1)
+    shape = TriMesh()
+    samplenum, last_edge, rad = record_gen.draw_spiral(0, audio, 0, rg.outer_rad, 0, shape, False)
+    assert samplenum == 2 * steps
+    assert np.isclose(rad, rg.outer_rad - 2 * steps * rg.radIncr)
+    # One revolution of quad strips per rail pair, three pairs per revolution
+    assert len(shape) == 2 * 3 * 2 * (steps - 1)
+
+    theta = rg.incrNum * 5
+    g_h = record_gen.groove_height(audio, 5)
+    rad = rg.outer_rad - 5 * rg.radIncr
+    rails = record_gen.groove_rails(np.array([rad]), rg.revolution_table[5:6], np.array([g_h]))
+    expected = [record_gen.outer_upper_vertex(rad, rg.amplitude, rg.bevel, theta),
+                record_gen.inner_upper_vertex(rad, rg.amplitude, rg.bevel, theta),
+                record_gen.outer_lower_vertex(rad, theta, g_h),
+                record_gen.inner_lower_vertex(rad, theta, g_h)]
+    for rail, vertex in zip(rails, expected):
+        assert np.allclose(rail[0], vertex)
+
+def test_draw_spiral_short_audio():
+    shape = TriMesh()
+    samplenum, last_edge, rad = record_gen.draw_spiral(0, sine_audio(10), 0, rg.outer_rad, 0, shape, False)
+    assert samplenum == 0 and last_edge is None and len(shape) == 0
+
+def test_draw_spiral_reports_progress():
+    events = []
+    tracer = instrument.Tracer([lambda kind, record: events.append(record)])
+    audio = sine_audio(2 * rg.revolution_steps + 10)
+    record_gen.draw_spiral(0, audio, 0, rg.outer_rad, 0, TriMesh(), False, tracer=tracer)
+    assert [(event['name'], event['done'], event['total']) for event in events] == \
+        [('Groove drawn', 1, 2), ('Groove drawn', 2, 2)]
+
+def test_draw_spiral_workers_match_serial():
+    steps = len(record_gen.revolution_angles())
+    # Enough revolutions for every range to hold several
+    audio = sine_audio(steps * 20 + 7)
+    assert min(length for _, length in record_gen.revolution_ranges(20, 2)) > 1
+    serial, parallel = TriMesh(), TriMesh()
+    serial_result = record_gen.draw_spiral(0, audio, 0, rg.outer_rad, 0, serial, False)
+    parallel_result = record_gen.draw_spiral(0, audio, 0, rg.outer_rad, 0, parallel, False, workers=2)
+    assert serial_result[0] == parallel_result[0] == 20 * steps
+    assert serial_result[2] == parallel_result[2]
+    assert np.array_equal(serial_result[1], parallel_result[1])
+    assert np.array_equal(serial.get_vertices(), parallel.get_vertices())
+    assert np.array_equal(serial.get_faces_by_index(), parallel.get_faces_by_index())
+
+def test_parallel_jobs_are_taken_as_the_pool_gets_to_them():
+    taken = []
+    def jobs():
+        for job in range(100):
+            taken.append(job)
+            yield job
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        results = record_gen.ordered_results(executor, abs, jobs(), 4)
+        assert next(results) == 0
+        assert len(taken) == 4
+        assert list(results) == list(range(1, 100))
+    assert max(length for _, length in record_gen.revolution_ranges(10000, 2)) == record_gen.RANGE_REVOLUTIONS
+
+def test_revolutions_are_drawn_welded():
+    audio = sine_audio(rg.revolution_steps * 3)
+    shape, _ = record_gen.draw_revolutions(audio, 0, rg.outer_rad, 0, 0, 3)
+    for vertices in (shape.vertices, record_gen.draw_revolution(audio, 0, rg.outer_rad,
+                                                                rg.revolution_table, True)[0].vertices):
+        assert len(np.unique(vertices, axis=0)) == len(vertices)
+
+def test_revolution_table_does_not_drift():
+    table = rg.revolution_table
+    assert len(table) == rg.revolution_steps
+    assert not table.flags.writeable
+    assert table[-1, 0] == (rg.revolution_steps - 1) * rg.incrNum
+    assert np.allclose(table[:, 1:], np.column_stack((np.cos(table[:, 0]), np.sin(table[:, 0]))))
+
+def test_normalization_strategies():
+    signal = np.sin(np.arange(20000) * 0.01)
+    signal[5000] = -4
+    assert record_gen.audio_level(signal, chunk_frames=777) == 4
+    assert np.isclose(record_gen.audio_level(np.delete(signal, 5000), 'rms'), 1, atol=1e-3)
+    assert np.isclose(record_gen.audio_level(signal, 'percentile', 99.9, 777), 1, atol=1e-3)
+    assert record_gen.audio_level(np.zeros(10)) == 1
+
+    depths = record_gen.normalize_samples(signal, 1.0)
+    assert depths.dtype == np.float32
+    assert depths.min() == np.float32(0.125) and depths.max() == np.float32(0.25)
+    # Samples above the level are clipped to it
+    assert depths[5000] == np.float32(0.25)
+    layers = record_gen.normalize_samples(signal, 1.0, step=0.016)
+    assert np.allclose(layers / 0.016, np.round(layers / 0.016), atol=1e-4)
+    assert np.abs(layers - depths).max() <= 0.008 + 1e-6
+
+def test_adaptive_samples_stay_within_tolerance():
+    rng = np.random.default_rng(1)
+    heights = np.cumsum(rng.normal(0, 0.01, 500))
+    heights[100:300] = 0.2
+    keep = record_gen.adaptive_samples(heights, 0.005, max_span=40)
+    assert keep[0] == 0 and keep[-1] == len(heights) - 1
+    assert np.all(np.diff(keep) <= 40)
+    assert len(keep) < len(heights) - 150
+    assert np.abs(np.interp(np.arange(len(heights)), keep, heights[keep]) - heights).max() <= 0.005
+    assert len(record_gen.adaptive_samples(heights, 0)) == len(heights)
+
+def test_adaptive_revolution_is_a_valid_strip():
+    audio = np.zeros(rg.revolution_steps)
+    audio[:50] = sine_audio(50)
+    full, _ = record_gen.draw_revolution(audio, 0, rg.outer_rad, rg.revolution_table, True)
+    sparse, _ = record_gen.draw_revolution(audio, 0, rg.outer_rad, rg.revolution_table, True,
+                                           tolerance=0.001)
+    assert len(sparse) < len(full) / 2
+
+    def per_ring(mesh):
+        # Edge counts of the strips less those that grow with each ring of four vertices
+        report = mesh.validate()
+        rings = report.vertices // 4
+        return (report.boundary_edges - 2 * rings, report.non_manifold_edges,
+                report.inconsistent_edges - 8 * rings)
+    assert per_ring(sparse) == per_ring(full)
+
+def test_cached_revolution_reused_until_samples_change(tmp_path):
+    cache_dir = str(tmp_path)
+    audio = sine_audio(rg.revolution_steps + 10)
+    args = (0, rg.outer_rad, rg.revolution_table, True, 0, cache_dir)
+    drawn, edge, reused = record_gen.cached_revolution(audio, *args)
+    assert not reused
+    cached, cached_edge, reused = record_gen.cached_revolution(audio, *args)
+    assert reused
+    assert np.array_equal(cached.vertices[cached.faces], drawn.vertices[drawn.faces])
+    assert np.array_equal(cached_edge, edge)
+
+    # Samples past the end of the revolution are not part of it
+    audio[-1] = 1
+    assert record_gen.cached_revolution(audio, *args)[2]
+    audio[5] = 1
+    assert not record_gen.cached_revolution(audio, *args)[2]
+    assert record_gen.revolution_key(audio, rg.outer_rad) != record_gen.revolution_key(audio, rg.inner_rad)
+
+def test_parallel_run_reuses_serial_cache(tmp_path):
+    cache_dir = str(tmp_path)
+    audio = sine_audio(rg.revolution_steps * 20 + 3)
+    serial, parallel = TriMesh(), TriMesh()
+    record_gen.draw_spiral(0, audio, 0, rg.outer_rad, 0, serial, False, cache_dir=cache_dir)
+    cached = sorted(tmp_path.iterdir())
+    assert len(cached) == 20
+    record_gen.draw_spiral(0, audio, 0, rg.outer_rad, 0, parallel, False, workers=2, cache_dir=cache_dir)
+    assert sorted(tmp_path.iterdir()) == cached
+    assert np.array_equal(serial.vertices[serial.faces], parallel.vertices[parallel.faces])
+
+def test_revolutions_follow_their_config():
+    slower = rg.default_config().replace(RPM=33)
+    audio = sine_audio(slower.revolution_steps)
+    revolution, _ = record_gen.draw_revolution(audio, 0, rg.outer_rad, slower.revolution_table,
+                                               config=slower)
+    default, _ = record_gen.draw_revolution(audio, 0, rg.outer_rad, rg.revolution_table)
+    assert slower.revolution_steps > rg.revolution_steps
+    assert len(revolution) == 2 * 3 * (slower.revolution_steps - 1)
+    assert len(default) == 2 * 3 * (rg.revolution_steps - 1)
+    assert record_gen.revolution_key(audio, rg.outer_rad, config=slower) != \
+        record_gen.revolution_key(audio, rg.outer_rad)
+
+def test_mapped_audio_matches_in_memory(tmp_path):
+    import wave
+    filename = str(tmp_path / 'tone.wav')
+    frames = np.round(20000 * np.sin(np.arange(30000) * 0.02)).astype('<i2')
+    with wave.open(filename, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rg.samplingRate)
+        wav.writeframes(frames.tobytes())
+    mapped = record_gen.map_audio_data(filename, str(tmp_path))
+    in_memory = record_gen.normalize_audio_data(filename)
+    assert len(mapped) == len(in_memory)
+    assert np.allclose(mapped[100:4000], in_memory[100:4000], atol=1e-6)
+
+def test_record_body_is_one_closed_grid():
+    steps = rg.revolution_steps
+    for count in (0, 1, 3):
+        audio = sine_audio(count * steps + 5) + 0.2
+        body = record_gen.record_body(audio)
+        report = body.validate()
+        assert report.is_watertight and report.is_oriented
+        assert report.euler_characteristic == 0
+        # Four rings and four rows of the groove, each vertex made once
+        assert len(body.vertices) == 4 * steps + 4 * count * steps
+        assert len(np.unique(body.vertices, axis=0)) == len(body.vertices)
+        corners = body.vertices[body.faces]
+        volume = np.einsum('ij,ij->i', corners[:, 0], np.cross(corners[:, 1], corners[:, 2])).sum() / 6
+        assert volume > 0
+    # The groove follows the vertex helpers
+    assert np.allclose(body.vertices[4 * steps + 2 * count * steps + 7],
+                       record_gen.inner_lower_vertex(rg.outer_rad - 7 * rg.radIncr, 7 * rg.incrNum,
+                                                     record_gen.groove_height(audio, 7)), atol=1e-6)
+
+def test_grid_that_does_not_fit_leaves_no_file(tmp_path, monkeypatch):
+    config = rg.default_config()
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'stl').mkdir()
+    fit = int((config.outer_rad - config.inner_rad) / (config.radIncr * config.revolution_steps))
+    with pytest.raises(ValueError):
+        record_gen.main('long.wav', 'long', config=config, grid=True,
+                        samples=sine_audio((fit + 2) * config.revolution_steps))
+    assert list((tmp_path / 'stl').iterdir()) == []
@@ -1,45 +1,182 @@
 import configparser
+from collections import namedtuple
+from functools import lru_cache
 from math import pi
 
+import numpy as np
+
 
 def truncate(n, decimals=0):
     multiplier = 10 ** decimals
     return int(n * multiplier) / multiplier
 
 
+def truncate_array(arr, decimals=0):
+    """Element-wise truncate for numpy arrays"""
+    multiplier = 10 ** decimals
+    return np.trunc(arr * multiplier) / multiplier
+
+
+@lru_cache(maxsize=None)
+def angle_table(count, incr):
+    """Read only (count, 3) array of theta, cos(theta) and sin(theta).
+
+    theta is k * incr for k in range(count), computed from k rather than by
+    adding incr count times, so the last angle is as accurate as the first.
+    """
+    theta = np.arange(count) * incr
+    table = np.column_stack((theta, np.cos(theta), np.sin(theta)))
+    table.flags.writeable = False
+    return table
+
+
 # Set 2pi
 precision = 5
 tau = 2 * pi
 
-# Set global variable from constants file
-config = configparser.ConfigParser()
-config.read('record_constants.ini')
-
-# Audio setting
-samplingRate = int(config['Audio']['samplingRate'])
-RPM = int(config['Audio']['rpm'])
-DOWNSAMPLING = int(config['Audio']['downsampling'])
-
-# Record dimensions
-DIAMETER = float(config['Record Dimensions']['diameter'])
-RADIUS = float(config['Record Dimensions']['radius'])
-outer_rad = float(config['Record Dimensions']['outerRad'])
-inner_rad = float(config['Record Dimensions']['innerRad'])
-inner_hole = float(config['Record Dimensions']['innerHole'])
-record_height = int(config['Record Dimensions']['recordHeight'])
-
-# Groove dimensions
-microns_per_layer = config['Groove Dimensions'].getfloat('micronsPerLayer')
-bevel = config['Groove Dimensions'].getfloat('bevel')
-groove_width = config['Groove Dimensions'].getfloat('grooveWidth')
-rate_divisor = int(config['Groove Dimensions']['rateDivisor'])
-
-# 24 is the amplitude of signal (in 16 micron steps)
-amplitude = truncate((24 * microns_per_layer) / 1000, precision)
-# 6 is the measured in 16 microns steps, depth of tops of wave in groove from uppermost surface of record
-depth = truncate((6 * microns_per_layer) / 100, precision)
-# calculcate angular incrementation amount
-thetaIter = truncate((15 * samplingRate) / (DOWNSAMPLING * RPM), precision)
-incrNum = truncate(tau / thetaIter, precision)
-radIncr = truncate((groove_width + bevel * amplitude) / thetaIter,
-                   precision)  # calculate radial incrementation amount
+CONSTANTS_FILE = 'record_constants.ini'
+
+# Options of the constants file, each with its section, key and type
+SETTINGS = (
+    # Audio setting
+    ('samplingRate', 'Audio', 'samplingRate', int),
+    ('RPM', 'Audio', 'rpm', int),
+    ('DOWNSAMPLING', 'Audio', 'downsampling', int),
+    # Record dimensions
+    ('DIAMETER', 'Record Dimensions', 'diameter', float),
+    ('RADIUS', 'Record Dimensions', 'radius', float),
+    ('outer_rad', 'Record Dimensions', 'outerRad', float),
+    ('inner_rad', 'Record Dimensions', 'innerRad', float),
+    ('inner_hole', 'Record Dimensions', 'innerHole', float),
+    ('record_height', 'Record Dimensions', 'recordHeight', int),
+    # Groove dimensions
+    ('microns_per_layer', 'Groove Dimensions', 'micronsPerLayer', float),
+    ('bevel', 'Groove Dimensions', 'bevel', float),
+    ('groove_width', 'Groove Dimensions', 'grooveWidth', float),
+    ('rate_divisor', 'Groove Dimensions', 'rateDivisor', int),
+)
+# Keyword arguments of create() that are not read from the constants file
+OPTIONS = ('weld_tolerance', 'adaptive_tolerance', 'normalization', 'clip_percentile', 'quantize')
+DERIVED = ('groove_rate', 'amplitude', 'depth',
+           'thetaIter', 'incrNum', 'radIncr', 'revolution_steps')
+# Reference levels the audio can be normalized to, see record_gen.audio_level
+NORMALIZATIONS = ('peak', 'rms', 'percentile')
+
+
+def read_constants(filename=CONSTANTS_FILE):
+    """Options of each section of a constants file"""
+    parser = configparser.ConfigParser()
+    with open(filename) as fh:
+        parser.read_file(fh)
+    return {section: dict(parser[section]) for section in parser.sections()}
+
+
+class RecordConfig(namedtuple('RecordConfig',
+                              [name for name, _, _, _ in SETTINGS] + list(OPTIONS + DERIVED))):
+    """Immutable, hashable set of record constants.
+
+    Build one with create(), load() or replace(), which compute the derived
+    quantities once from the settings. Being a tuple it pickles to worker
+    processes and can key caches.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def create(cls, weld_tolerance=None, adaptive_tolerance=0.0, normalization='peak',
+               clip_percentile=99.9, quantize=False, **settings):
+        """Config from the settings named in SETTINGS.
+
+        Tolerances are in mm, vertices are welded within one layer unless
+        weld_tolerance is given and no groove samples are dropped unless
+        adaptive_tolerance is. normalization is one of NORMALIZATIONS and
+        quantize rounds the groove to whole layers.
+        """
+        if normalization not in NORMALIZATIONS:
+            raise ValueError("Unknown normalization {}".format(normalization))
+        unknown = sorted(set(settings) - {name for name, _, _, _ in SETTINGS})
+        if unknown:
+            raise TypeError("Unknown settings {}, derived quantities cannot be set".format(
+                ", ".join(unknown)))
+        settings = {name: kind(settings[name]) for name, _, _, kind in SETTINGS}
+        microns_per_layer = settings['microns_per_layer']
+        if weld_tolerance is None:
+            weld_tolerance = microns_per_layer / 1000
+        # 24 is the amplitude of signal (in 16 micron steps)
+        amplitude = truncate((24 * microns_per_layer) / 1000, precision)
+        # calculcate angular incrementation amount
+        theta_iter = truncate((15 * settings['samplingRate'])
+                              / (settings['DOWNSAMPLING'] * settings['RPM']), precision)
+        incr_num = truncate(tau / theta_iter, precision)
+        return cls(weld_tolerance=float(weld_tolerance),
+                   adaptive_tolerance=float(adaptive_tolerance),
+                   normalization=normalization,
+                   clip_percentile=float(clip_percentile),
+                   quantize=bool(quantize),
+                   # Rate of the samples engraved along the groove
+                   groove_rate=settings['samplingRate'] / settings['rate_divisor'],
+                   amplitude=amplitude,
+                   # 6 is the measured in 16 microns steps, depth of tops of wave in groove
+                   # from uppermost surface of record
+                   depth=truncate((6 * microns_per_layer) / 100, precision),
+                   thetaIter=theta_iter,
+                   incrNum=incr_num,
+                   # calculate radial incrementation amount
+                   radIncr=truncate((settings['groove_width'] + settings['bevel'] * amplitude)
+                                    / theta_iter, precision),
+                   # Samples in one revolution of the spiral
+                   revolution_steps=int(np.ceil(tau / incr_num)),
+                   **settings)
+
+    @classmethod
+    def load(cls, filename=CONSTANTS_FILE, overrides=None):
+        """Config read from a constants file, see from_constants"""
+        return cls.from_constants(read_constants(filename), overrides)
+
+    @classmethod
+    def from_constants(cls, constants, overrides=None):
+        """Config from the sections of a constants file, see read_constants.
+
+        overrides maps section names of the file to the options to replace
+        in them, e.g. {'Audio': {'rpm': 45}}.
+        """
+        parser = configparser.ConfigParser()
+        parser.read_dict(constants)
+        parser.read_dict({section: {key: str(value) for key, value in options.items()}
+                          for section, options in (overrides or {}).items()})
+        audio, groove = parser['Audio'], parser['Groove Dimensions']
+        # Tolerances are given in microns
+        weld_tolerance = groove.getfloat('weldTolerance', groove.getfloat('micronsPerLayer'))
+        return cls.create(weld_tolerance=weld_tolerance / 1000,
+                          adaptive_tolerance=groove.getfloat('adaptiveTolerance', 0) / 1000,
+                          normalization=audio.get('normalization', 'peak'),
+                          clip_percentile=audio.getfloat('clipPercentile', 99.9),
+                          quantize=groove.getboolean('quantizeLayers', False),
+                          **{name: parser[section][key] for name, section, key, _ in SETTINGS})
+
+    def settings(self):
+        """Keyword arguments of create() giving this config"""
+        names = [name for name, _, _, _ in SETTINGS] + list(OPTIONS)
+        return {name: getattr(self, name) for name in names}
+
+    def replace(self, **settings):
+        """Copy with some settings changed and the quantities derived again"""
+        return self.create(**dict(self.settings(), **settings))
+
+    @property
+    def revolution_table(self):
+        """Angles of the samples in one revolution of the spiral, see angle_table"""
+        return angle_table(self.revolution_steps, self.incrNum)
+
+
+@lru_cache(maxsize=None)
+def default_config():
+    """Config read from record_constants.ini in the working directory on first use"""
+    return RecordConfig.load()
+
+
+def __getattr__(name):
+    # Constants such as rg.RPM read from the default config, so importing
+    # this module reads no file
+    if name in RecordConfig._fields or name == 'revolution_table':
+        return getattr(default_config(), name)
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
@@ -0,0 +1,49 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+import record_globals as rg
+
+
+def test_import_reads_no_file(tmp_path):
+    # No constants file in the working directory until a constant is used
+    code = "import record_globals as rg; rg.RecordConfig; print('imported')"
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.abspath(rg.__file__)))
+    output = subprocess.run([sys.executable, '-c', code], cwd=str(tmp_path), env=env,
+                            capture_output=True, text=True, check=True).stdout
+    assert output.strip() == 'imported'
+
+def test_config_overrides():
+    config = rg.default_config()
+    faster = rg.RecordConfig.load(overrides={'Audio': {'rpm': config.RPM * 2}})
+    assert faster.RPM == config.RPM * 2
+    assert np.isclose(faster.thetaIter, config.thetaIter / 2, atol=1e-4)
+    assert faster == config.replace(RPM=config.RPM * 2)
+    assert hash(faster) != hash(config) and rg.default_config() == config
+    assert rg.RPM == config.RPM
+
+def test_config_derived_quantities():
+    config = rg.default_config().replace(samplingRate=48000, RPM=33, microns_per_layer=20)
+    assert config.thetaIter == rg.truncate(15 * 48000 / (config.DOWNSAMPLING * 33), rg.precision)
+    assert config.incrNum == rg.truncate(rg.tau / config.thetaIter, rg.precision)
+    assert config.amplitude == rg.truncate(24 * 20 / 1000, rg.precision)
+    assert config.weld_tolerance == rg.default_config().weld_tolerance
+    assert len(config.revolution_table) == config.revolution_steps
+
+def test_config_normalization():
+    config = rg.RecordConfig.load(overrides={'Audio': {'normalization': 'rms'},
+                                             'Groove Dimensions': {'quantizeLayers': 'yes'}})
+    assert config.normalization == 'rms' and config.quantize
+    assert rg.default_config().normalization == 'peak' and not rg.default_config().quantize
+    assert config.replace(RPM=33).normalization == 'rms'
+    with pytest.raises(ValueError):
+        config.replace(normalization='loudest')
+
+def test_config_rejects_unknown_settings():
+    config = rg.default_config()
+    for settings in ({'rpm': 33}, {'amplitude': 9}):
+        with pytest.raises(TypeError):
+            config.replace(**settings)
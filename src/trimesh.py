@@ -1,14 +1,12 @@
-
-import copy
-from collections import OrderedDict, namedtuple
+from collections import namedtuple
 from math import sqrt
-from itertools import combinations
 
 import numpy as np
-from bidict import bidict
 # https://pypi.org/project/numpy-stl/
 from stl import mesh
 
+from mesh_validation import ValidationReport, edge_incidence, validate_faces
+
 Vertex = namedtuple('Vertex', 'x y z')
 
 def squared_magnitude(a, b):
@@ -31,132 +29,333 @@ def area_of_triangle(vertices):
     return base * height / 2
 
 
+def triangle_normals(vectors):
+    """Unnormalized normals of an (n, 3, 3) array of triangles, as numpy-stl
+    computes them"""
+    return np.cross(vectors[:, 1] - vectors[:, 0], vectors[:, 2] - vectors[:, 0])
+
+
+def canonical_faces(faces):
+    """Rotate every face so its smallest index comes first, keeping the winding"""
+    shift = np.argmin(faces, axis=1)
+    return np.take_along_axis(faces, (shift[:, None] + np.arange(3)) % 3, axis=1)
+
+
+def _row_keys(arr):
+    """Pack the rows of an integer array into one int64 each, if they fit"""
+    if not np.issubdtype(arr.dtype, np.integer):
+        return None
+    low = arr.min(axis=0).astype(np.int64)
+    bits = [int(span).bit_length() for span in arr.max(axis=0) - low]
+    if sum(bits) > 63:
+        return None
+    keys = np.zeros(len(arr), dtype=np.int64)
+    for column, width in enumerate(bits):
+        keys <<= width
+        keys |= arr[:, column] - low[column]
+    return keys
+
+
+def unique_rows(arr):
+    """Find identical rows of a 2D array with a stable sort.
+
+    Returns the index of the first occurrence of every distinct row, in order
+    of appearance, and the inverse mapping each row to its position in that
+    list.
+    """
+    count = len(arr)
+    if count == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    starts = np.empty(count, dtype=bool)
+    starts[0] = True
+    keys = _row_keys(arr)
+    if keys is None:
+        order = np.lexsort(arr.T[::-1])
+        sorted_rows = arr[order]
+        np.any(sorted_rows[1:] != sorted_rows[:-1], axis=1, out=starts[1:])
+    else:
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        np.not_equal(sorted_keys[1:], sorted_keys[:-1], out=starts[1:])
+    group = np.cumsum(starts) - 1
+    # The sort is stable so the head of every group is its first occurrence
+    first = order[starts]
+    appearance = np.argsort(first, kind='stable')
+    rank = np.empty(len(first), dtype=np.int64)
+    rank[appearance] = np.arange(len(first))
+    inverse = np.empty(count, dtype=np.int64)
+    inverse[order] = rank[group]
+    return first[appearance], inverse
+
+
+def quad_faces(q0, q1, q2, q3, coords):
+    """Split quads into two triangles each, cutting across the longest
+    diagonal from the first corner. Corners are index arrays into coords."""
+    p0 = coords[q0]
+    dist = np.zeros((len(q0), 4))
+    for i, q in enumerate((q1, q2, q3), 1):
+        dist[:, i] = np.sum((coords[q] - p0) ** 2, axis=1)
+    index = np.argmax(dist, axis=1)
+
+    # draw_triangles((a, d), (b, c)) -> [a, b, c], [b, c, d]
+    b = np.where(index == 1, q2, q1)
+    c = np.where(index == 1, q3, np.where(index == 2, q3, q2))
+    d = np.where(index == 1, q1, np.where(index == 2, q2, q3))
+    faces = np.empty((len(q0), 2, 3), dtype=np.int64)
+    faces[:, 0] = np.column_stack((q0, b, c))
+    faces[:, 1] = np.column_stack((b, c, d))
+    return faces.reshape(-1, 3)
+
+
+class _RowBuffer():
+    """Growable array of fixed width rows"""
+    def __init__(self, dtype, width=3, capacity=64):
+        self._data = np.empty((capacity, width), dtype=dtype)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def view(self):
+        return self._data[:self._size]
+
+    def reserve(self, capacity):
+        if capacity > len(self._data):
+            capacity = max(capacity, 2 * len(self._data))
+            data = np.empty((capacity, self._data.shape[1]), dtype=self._data.dtype)
+            data[:self._size] = self.view()
+            self._data = data
+
+    def extend(self, rows) -> int:
+        """Append rows and return the index of the first one"""
+        start = self._size
+        self.reserve(start + len(rows))
+        self._data[start:start + len(rows)] = rows
+        self._size += len(rows)
+        return start
+
+    def replace(self, rows):
+        self._size = 0
+        self.extend(rows)
+
+
 class TriMesh():
-    def __init__(self, dictionary={}):
-        self.vertices = bidict(dictionary)
-        self.faces = []
+    """Indexed triangle mesh stored as float64 vertex and int32 face arrays.
+
+    Vertices are appended without looking them up, so the same point may be
+    stored several times. Duplicates are merged by weld(), which every reader
+    calls first; indices returned by add_vertex are only stable until then.
+    """
+    def __init__(self, vertices=None):
+        self._vertices = _RowBuffer(np.float64)
+        self._faces = _RowBuffer(np.int32)
+        self._welded = True
+        if vertices is not None:
+            self.add_vertices(vertices)
+
+    @classmethod
+    def from_arrays(cls, vertices, faces, welded=False):
+        """Mesh over existing vertex and face index arrays.
+
+        welded skips welding the vertices, for arrays taken from a welded mesh.
+        """
+        trimesh = cls()
+        trimesh.add_vertex_array(vertices)
+        trimesh.add_face_array(faces)
+        trimesh._welded = welded
+        return trimesh
+
+    def copy(self):
+        return TriMesh.from_arrays(self.vertices, self.faces, welded=True)
 
     def __str__(self):
         return str(self.vertices)
 
     def __len__(self):
-        return len(self.faces)
+        return len(self._faces)
+
+    @property
+    def vertices(self):
+        self.weld()
+        return self._vertices.view()
+
+    @property
+    def faces(self):
+        self.weld()
+        return self._faces.view()
+
+    def weld(self, tolerance=0.0) -> int:
+        """Merge vertices and return how many were removed.
+
+        With a tolerance, vertices are snapped to an integer grid of that
+        spacing and those sharing a grid point are merged, keeping the first
+        one's position. Otherwise only identical vertices are merged.
+        """
+        if self._welded and not tolerance:
+            return 0
+        # Adding zero folds -0.0 into 0.0 so both compare as the same row
+        vertices = self._vertices.view() + 0.0
+        if tolerance:
+            first, inverse = unique_rows(np.rint(vertices / tolerance).astype(np.int64))
+        else:
+            first, inverse = unique_rows(vertices)
+        removed = len(vertices) - len(first)
+        if removed:
+            self._vertices.replace(vertices[first])
+            self._faces.replace(inverse[self._faces.view()])
+        self._welded = True
+        return removed
+
+    def add_vertex_array(self, arr) -> int:
+        """Append an (n, 3) array of vertices and return the first index"""
+        arr = np.asarray(arr, dtype=np.float64).reshape(-1, 3)
+        self._welded = self._welded and len(arr) == 0
+        return self._vertices.extend(arr)
+
+    def add_face_array(self, arr):
+        """Append an (n, 3) array of vertex indices"""
+        arr = np.asarray(arr).reshape(-1, 3)
+        if len(arr) and (arr.max() >= len(self._vertices) or arr.min() < 0):
+            raise IndexError
+        self._faces.extend(arr)
 
     def add_vertex(self, xyz) -> int:
         assert len(xyz) == 3
-        index = len(self.vertices)
-        if xyz not in self.vertices.inverse:
-            self.vertices[index] = Vertex(*xyz)
-            return index
-        else:
-            return -1
+        return self.add_vertex_array(xyz)
 
     def add_vertices(self, lst):
-        for v in lst:
-            self.add_vertex(Vertex(*v))
+        self.add_vertex_array(list(lst))
 
     # It is faster to add all the faces and remove duplicates at the end
     # then to check after every add
     def add_face(self, vertices):
-        self.add_vertices(vertices)
-        new_face = tuple([self.vertices.inverse[item] for item in vertices])
-        self.faces.append(new_face)
+        assert len(vertices) == 3
+        start = self.add_vertex_array(vertices)
+        self._faces.extend(np.arange(start, start + 3).reshape(1, 3))
 
     def add_faces(self, lst):
         for f in lst:
             self.add_face(Vertex(*f))
 
     def add_faces_by_index(self, lst):
-        for f in lst:
-            if max(f) < len(self.vertices):
-                self.faces.append(f)
-            else:
-                raise IndexError
+        self.weld()
+        self.add_face_array(list(lst))
 
     def add_quad(self, faces):
         """Add quaderlateral face"""
         assert len(faces) == 4
-        def draw_triangles(diagonal_1, diagonal_2):
-            a, d = diagonal_1
-            b, c = diagonal_2
-            self.add_face([a, b, c])
-            self.add_face([b, c, d])
-        
-        dist = [0]
-        for i in range(1,4):
-            dist.append(squared_magnitude(faces[0], faces[i]))
-        index = dist.index(max(dist))
-        if index == 1:
-            draw_triangles((faces[0], faces[1]), (faces[2], faces[3]))
-        elif index == 2:
-            draw_triangles((faces[0], faces[2]), (faces[1], faces[3]))
-        else:
-            draw_triangles((faces[0], faces[3]), (faces[1], faces[2]))
+        start = self.add_vertex_array(faces)
+        q = [np.array([start + i]) for i in range(4)]
+        self._faces.extend(quad_faces(*q, self._vertices.view()))
 
     def get_vertices(self):
         """ Returns a numpy array of cartesian coordinates """
-        lst = [self.vertices[i] for i in range(0, len(self.vertices))]
-        return np.array(lst)
+        if len(self._vertices) == 0:
+            return np.array([])
+        return self.vertices.copy()
 
     def get_faces_vertices(self):
+        vertices = self.vertices
         for f in self.faces:
-            yield tuple(map(lambda index: self.vertices[index], f))
+            yield tuple(Vertex(*vertices[index]) for index in f)
 
     def get_faces_by_index(self):
-        return np.array(self.faces)
+        if len(self._faces) == 0:
+            return np.array([])
+        return self.faces.copy()
 
     def get_edges(self):
-        edge_lst = []
-        for face in self.faces:
-            edge_lst.extend(combinations(list(face), 2))
-        return set(edge_lst)
+        _, pairs, _, _ = edge_incidence(self.faces)
+        return set(map(tuple, pairs.tolist()))
+
+    def _strip_indices(self, list_a, list_b):
+        """Append the vertices of two strips and return their indices"""
+        length = min(len(list_a), len(list_b))
+        a = self.add_vertex_array(list_a[:length])
+        b = self.add_vertex_array(list_b[:length])
+        return np.arange(a, a + length), np.arange(b, b + length)
+
+    def tristrip_by_index(self, index_a, index_b):
+        lst = min(len(index_a), len(index_b)) - 1
+        if lst < 1:
+            return
+        faces = np.empty((lst, 2, 3), dtype=np.int64)
+        faces[:, 0] = np.column_stack((index_a[:lst], index_a[1:lst + 1], index_b[:lst]))
+        faces[:, 1] = np.column_stack((index_b[:lst], index_b[1:lst + 1], index_a[1:lst + 1]))
+        self._faces.extend(faces.reshape(-1, 3))
+
+    def quadstrip_by_index(self, index_a, index_b):
+        lst = min(len(index_a), len(index_b)) - 1
+        if lst < 1:
+            return
+        self._faces.extend(quad_faces(
+            index_a[:lst], index_a[1:lst + 1], index_b[:lst], index_b[1:lst + 1],
+            self._vertices.view()))
 
     def tristrip(self, list_a, list_b):
-        lst = min(len(list_a), len(list_b)) - 1
-        for i in range(0, lst):
-            self.add_face(Vertex(list_a[i], list_a[i + 1], list_b[i]))
-            self.add_face(Vertex(list_b[i], list_b[i + 1], list_a[i + 1]))
-        
+        self.tristrip_by_index(*self._strip_indices(list_a, list_b))
+
     def quadstrip(self, list_a, list_b):
-        lst = min(len(list_a), len(list_b)) - 1
-        for i in range(0, lst):
-            self.add_quad((list_a[i], list_a[i + 1], list_b[i], list_b[i+1]))
-            
+        self.quadstrip_by_index(*self._strip_indices(list_a, list_b))
 
     def merge(self, trimesh):
         assert type(self) == type(trimesh)
-        self.add_vertices(trimesh.get_vertices().tolist())
-        for face in trimesh.get_faces_vertices():
-            self.add_face(face)
+        start = self.add_vertex_array(trimesh.vertices)
+        self._faces.extend(trimesh.faces + start)
         return self
 
-    def _faces_removed(self, func, string = ''):
+    def _faces_removed(self, func) -> int:
+        """Replace the faces with func(faces) and return how many were removed"""
         number_of_faces = len(self)
-        self.faces = func(self.faces)
-        print(string + "Faces removed: ", number_of_faces - len(self))
+        self._faces.replace(func(self.faces))
+        return number_of_faces - len(self)
+
+    def remove_duplicate_faces(self) -> int:
+        """Removes faces repeating an earlier face, even with rotated corners"""
+        return self._faces_removed(lambda x: x[unique_rows(canonical_faces(x))[0]])
 
-    def remove_duplicate_faces(self):
-        self._faces_removed(lambda x: list(OrderedDict.fromkeys(x)), 'Duplicate ')
+    def remove_empty_faces(self, tolerance=0.0) -> int:
+        """ Removes faces of colinear vertices
 
-    def remove_empty_faces(self):
-        """ Removes faces of colinear vertices"""
-        self._faces_removed(lambda x: list(
-            filter(lambda f: f[0] != f[1] and f[0] != f[2] and f[1] != f[2], x)), 'Empty ')
+        A face is empty when it repeats a vertex index or its area is no more
+        than tolerance.
+        """
+        vertices = self.vertices
+        def non_empty(x):
+            keep = (x[:, 0] != x[:, 1]) & (x[:, 0] != x[:, 2]) & (x[:, 1] != x[:, 2])
+            areas = np.linalg.norm(triangle_normals(vertices[x[keep]]), axis=1) / 2
+            keep[keep] = areas > tolerance
+            return x[keep]
+        return self._faces_removed(non_empty)
+
+    def clean(self, tolerance=0.0):
+        """Remove duplicate then empty faces, returning both counts"""
+        return self.remove_duplicate_faces(), self.remove_empty_faces(tolerance)
+
+    def validate(self) -> ValidationReport:
+        """Edge incidence report, see mesh_validation"""
+        return validate_faces(self.faces)
+
+    def is_manifold(self) -> bool:
+        """True when the mesh is closed and every edge joins exactly two faces"""
+        return self.validate().is_watertight
 
     def euler_characteristic(self):
-        number_of_vertices = len(self.faces)
-        number_of_faces = len(self.faces)
-        edge_set = self.get_edges()
-        number_of_edges = len(edge_set)
-        return abs(number_of_vertices - number_of_edges + number_of_faces)
-
-    def trimesh_to_npmesh(self) -> mesh.Mesh:
-        vertices = self.get_vertices()
-        number_of_faces = len(self.faces)
+        """V - E + F over the vertices used by faces"""
+        return self.validate().euler_characteristic
+
+    def trimesh_to_npmesh(self, data=None) -> mesh.Mesh:
+        """Convert to a numpy-stl mesh with one gather from the vertex array.
+
+        data may be a caller supplied record array of mesh.Mesh.dtype with one
+        row per face, such as a np.memmap over an STL file, to fill in place.
+        """
         faces = self.faces
-        rec = mesh.Mesh(
-            data=np.zeros(number_of_faces, dtype=mesh.Mesh.dtype), speedups=True)
-        for f in range(number_of_faces):
-            for j in range(3):
-                rec.vectors[f][j] = vertices[faces[f][j], :]
-        return rec
+        if data is None:
+            data = np.zeros(len(faces), dtype=mesh.Mesh.dtype)
+        elif len(data) != len(faces):
+            raise ValueError("Expected {} records, got {}".format(len(faces), len(data)))
+        vectors = self.vertices[faces]
+        data['vectors'] = vectors
+        data['normals'] = triangle_normals(vectors)
+        return mesh.Mesh(data, calculate_normals=False, speedups=True)
@@ -50,7 +50,7 @@ def test_trimesh_pyramid_test():
     trimesh.add_faces_by_index(faces)
     trimesh.trimesh_to_npmesh().save('stl/pyramidtest.stl', mode=stl.Mode.BINARY)
     assert np.array_equal(trimesh.get_faces_by_index(), np.array(faces))
-    assert trimesh.euler_characteristic() == 3
+    assert trimesh.euler_characteristic() == 2
 
 #Generated mesh saved to "stl/cubetest.stl"
 def test_trimesh_cube_test():
@@ -90,5 +90,65 @@ def test_trimesh_merge():
 
     trimesh = pyramid_trimesh.merge(cube_trimesh)
     trimesh.trimesh_to_npmesh().save('stl/house_test.stl', mode=stl.Mode.BINARY)
-    assert trimesh.euler_characteristic() == 5
-    
\ No newline at end of file
+    assert trimesh.euler_characteristic() == 2
+    
+def test_trimesh_weld():
+    trimesh = TriMesh()
+    trimesh.add_face([Vertex(0, 0, 0), Vertex(1, 0, 0), Vertex(0, 1, 0)])
+    trimesh.add_face([Vertex(1, 0, 0), Vertex(0, 1, 0), Vertex(-0.0, 0, 1)])
+    assert trimesh.weld() == 2
+    assert np.array_equal(trimesh.get_vertices(),
+                          np.array([(0, 0, 0), (1, 0, 0), (0, 1, 0), (0, 0, 1)]))
+    assert np.array_equal(trimesh.get_faces_by_index(), np.array([(0, 1, 2), (1, 2, 3)]))
+    assert trimesh.vertices.dtype == np.float64
+    assert trimesh.faces.dtype == np.int32
+
+def test_trimesh_quadstrip():
+    trimesh = TriMesh()
+    upper = [Vertex(x, 0, 1) for x in range(4)]
+    lower = [Vertex(x, 0, 0) for x in range(4)]
+    trimesh.quadstrip(upper, lower)
+    assert len(trimesh) == 6
+    assert len(trimesh.get_vertices()) == 8
+    assert trimesh.get_faces_by_index().max() == 7
+
+def test_trimesh_to_npmesh():
+    trimesh = TriMesh()
+    vertices = [Vertex(1, 0, 0), Vertex(-1, 0, 0), Vertex(0, 1, 0), Vertex(0, -1, 0), Vertex(0, 0, 1)]
+    faces = [(0, 2, 3), (1, 2, 3), (0, 2, 4), (1, 2, 4), (0, 3, 4), (1, 3, 4)]
+    trimesh.add_vertices(vertices)
+    trimesh.add_faces_by_index(faces)
+    rec = trimesh.trimesh_to_npmesh()
+    for f, face in enumerate(faces):
+        for j in range(3):
+            assert np.array_equal(rec.vectors[f][j], vertices[face[j]])
+    assert np.allclose(rec.normals, stl.mesh.Mesh(rec.data.copy()).normals)
+    with pytest.raises(ValueError):
+        trimesh.trimesh_to_npmesh(data=np.zeros(1, dtype=stl.mesh.Mesh.dtype))
+
+def test_trimesh_remove_rotated_duplicate_faces():
+    trimesh = TriMesh()
+    trimesh.add_vertices([Vertex(0, 0, 0), Vertex(1, 0, 0), Vertex(0, 1, 0)])
+    faces = [(0, 1, 2), (1, 2, 0), (2, 0, 1), (0, 2, 1), (2, 1, 0)]
+    trimesh.add_faces_by_index(faces)
+    # Reversed winding is a different face
+    assert trimesh.remove_duplicate_faces() == 3
+    assert np.array_equal(trimesh.get_faces_by_index(), np.array([(0, 1, 2), (0, 2, 1)]))
+
+def test_trimesh_remove_zero_area_faces():
+    trimesh = TriMesh()
+    trimesh.add_vertices([Vertex(0, 0, 0), Vertex(1, 0, 0), Vertex(2, 0, 0), Vertex(0, 1, 0)])
+    trimesh.add_faces_by_index([(0, 1, 2), (0, 1, 3), (0, 0, 3)])
+    assert trimesh.clean() == (0, 2)
+    assert np.array_equal(trimesh.get_faces_by_index(), np.array([(0, 1, 3)]))
+    assert trimesh.remove_empty_faces(tolerance=1) == 1
+
+def test_trimesh_weld_tolerance():
+    trimesh = TriMesh()
+    trimesh.add_face([Vertex(0, 0, 0), Vertex(1, 0, 0), Vertex(0, 1, 0)])
+    trimesh.add_face([Vertex(1.004, 0, 0), Vertex(0, 1.003, 0), Vertex(0, 0, 1)])
+    assert trimesh.weld() == 0
+    assert trimesh.weld(tolerance=0.01) == 2
+    assert np.array_equal(trimesh.get_vertices(),
+                          np.array([(0, 0, 0), (1, 0, 0), (0, 1, 0), (0, 0, 1)]))
+    assert np.array_equal(trimesh.get_faces_by_index(), np.array([(0, 1, 2), (1, 2, 3)]))